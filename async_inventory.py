@@ -0,0 +1,195 @@
+import asyncio
+import functools
+
+from code_normal import Product, Inventory, Order, Rule, QUANTITY_CHANGE, POSITIVE_QUANTITY
+
+OPTIONAL_INVENTORY = Rule((Inventory, type(None)), TypeError, "Inventory must be an Inventory instance.")
+OPTIONAL_ORDER = Rule((Order, type(None)), TypeError, "Order must be an Order instance.")
+
+
+class AsyncInventory:
+    """
+    asyncio facade over an Inventory. Stock changes for the same product that arrive
+    while its lock is busy are queued and applied together as one stock mutation, after
+    which the optional flush coroutine (for example a persistence commit) is awaited.
+    If the flush fails, the mutation is undone and every change in the batch fails.
+    """
+    def __init__(self, inventory: Inventory = None, flush=None):
+        """Initializes the AsyncInventory. Raises: TypeError."""
+        OPTIONAL_INVENTORY.check(inventory)
+        self.inventory = inventory if inventory is not None else Inventory()
+        self.mutation_count = 0
+        self._flush = flush
+        self._locks = {}
+        self._pending = {}
+        self._drains = set()
+        self._last_drains = {}
+
+    def get_product(self, product_id: str) -> Product:
+        """Retrieves a product from inventory by ID. Raises: TypeError, KeyError."""
+        return self.inventory.get_product(product_id)
+
+    def get_stock_level(self, product_id: str) -> int:
+        """Gets stock level for a product. Raises: TypeError, KeyError."""
+        return self.inventory.get_stock_level(product_id)
+
+    async def add_product(self, product: Product, initial_stock: int = None) -> None:
+        """Adds a product to the inventory. Raises: TypeError, ValueError."""
+        self.inventory.add_product(product, initial_stock)
+        if self._flush:
+            await self._flush()
+
+    async def remove_product(self, product_id: str) -> Product:
+        """Removes a product from inventory by ID once the stock changes queued before it are applied. Raises: TypeError, KeyError."""
+        drain = self._last_drains.get(product_id)
+        if drain is not None:
+            await asyncio.wait((drain,))
+        async with self._lock_for(product_id):
+            product = self.inventory.remove_product(product_id)
+        if self._flush:
+            await self._flush()
+        return product
+
+    async def update_stock(self, product_id: str, quantity_change: int) -> None:
+        """Updates stock quantity of a product. Raises: TypeError, KeyError, ValueError."""
+        QUANTITY_CHANGE.check(quantity_change)
+        await self._submit(product_id, quantity_change, reservation=False)
+
+    async def reserve(self, product_id: str, quantity: int) -> None:
+        """Takes quantity units of a product out of stock. Raises: TypeError, KeyError, ValueError."""
+        POSITIVE_QUANTITY.check(quantity)
+        await self._submit(product_id, -quantity, reservation=True)
+
+    async def release(self, product_id: str, quantity: int) -> None:
+        """Returns quantity reserved units of a product to stock. Raises: TypeError, KeyError, ValueError."""
+        POSITIVE_QUANTITY.check(quantity)
+        await self._submit(product_id, quantity, reservation=False)
+
+    async def _submit(self, product_id: str, change: int, reservation: bool) -> None:
+        """Queues a stock change for a product and waits until its batch has been applied."""
+        self.inventory.get_product(product_id)
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.get(product_id)
+        if pending is None:
+            pending = self._pending[product_id] = []
+            drain = asyncio.create_task(self._drain(product_id))
+            self._drains.add(drain)
+            self._last_drains[product_id] = drain
+            drain.add_done_callback(self._drains.discard)
+            drain.add_done_callback(functools.partial(self._forget_drain, product_id))
+        pending.append((change, reservation, future))
+        await future
+
+    async def _drain(self, product_id: str) -> None:
+        """Applies every queued change for a product as one stock mutation, in arrival order."""
+        async with self._lock_for(product_id):
+            batch = self._pending.pop(product_id)
+            accepted = []
+            try:
+                product = self.inventory.get_product(product_id)
+                quantity = product.quantity
+                for change, reservation, future in batch:
+                    if future.cancelled():
+                        continue
+                    if quantity + change >= 0:
+                        quantity += change
+                        accepted.append(future)
+                    elif reservation:
+                        future.set_exception(ValueError(
+                            f"Not enough stock for {product.name} (ID: {product_id}). "
+                            f"Requested: {-change}, Available: {quantity}"))
+                    else:
+                        future.set_exception(ValueError(
+                            f"Stock update for {product_id} failed: Quantity cannot be reduced below zero."))
+                change = quantity - product.quantity
+                if change:
+                    self.inventory.update_stock(product_id, change)
+                    self.mutation_count += 1
+                if self._flush:
+                    try:
+                        await self._flush()
+                    except Exception:
+                        if change:
+                            self.inventory.update_stock(product_id, -change)
+                        raise
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for future in accepted:
+                if not future.done():
+                    future.set_result(None)
+
+    def _forget_drain(self, product_id: str, drain: asyncio.Task) -> None:
+        """Drops a finished drain from the per-product record of the latest one."""
+        if self._last_drains.get(product_id) is drain:
+            del self._last_drains[product_id]
+
+    def _lock_for(self, product_id: str) -> asyncio.Lock:
+        """Returns the asyncio lock serializing stock changes of a product."""
+        lock = self._locks.get(product_id)
+        if lock is None:
+            lock = self._locks[product_id] = asyncio.Lock()
+        return lock
+
+
+class AsyncOrder:
+    """
+    asyncio facade over an Order whose stock is reserved through an AsyncInventory.
+    """
+    def __init__(self, inventory: AsyncInventory, order: Order = None):
+        """Initializes the AsyncOrder. Raises: TypeError."""
+        ASYNC_INVENTORY.check(inventory)
+        OPTIONAL_ORDER.check(order)
+        self.inventory = inventory
+        self.order = order if order is not None else Order()
+
+    async def add_item(self, product: Product, quantity: int) -> None:
+        """Reserves stock and adds an item to the order. Raises: RuntimeError, TypeError, ValueError, KeyError."""
+        await self.add_items([(product, quantity)])
+
+    async def add_items(self, lines) -> None:
+        """Reserves stock for every line concurrently, all-or-nothing, then adds them. Raises: RuntimeError, TypeError, ValueError, KeyError."""
+        cart = {}
+        for product, quantity in lines:
+            self.order._check_new_item(product, quantity)
+            if product.product_id in cart:
+                cart[product.product_id][1] += quantity
+            else:
+                cart[product.product_id] = [product, quantity]
+
+        results = await asyncio.gather(
+            *(self.inventory.reserve(product_id, quantity) for product_id, (_, quantity) in cart.items()),
+            return_exceptions=True
+        )
+        reserved = [(product_id, quantity) for (product_id, (_, quantity)), result in zip(cart.items(), results)
+                    if result is None]
+        errors = [result for result in results if result is not None]
+        if not errors and self.order._is_finalized:
+            errors.append(RuntimeError("Cannot add items to a finalized order."))
+        if errors:
+            await asyncio.gather(*(self.inventory.release(product_id, quantity) for product_id, quantity in reserved))
+            raise errors[0]
+
+        for product, quantity in cart.values():
+            self.order._add_line(product, quantity)
+
+    async def remove_item(self, product_id: str, quantity_to_remove: int) -> None:
+        """Removes item quantity from the order and restocks it. Raises: RuntimeError, TypeError, ValueError, KeyError."""
+        self.order.remove_item(product_id, quantity_to_remove)
+        try:
+            await self.inventory.release(product_id, quantity_to_remove)
+        except KeyError:
+            raise RuntimeError(f"Product {product_id} not found in inventory for restocking. Inconsistent state.")
+
+    def calculate_total(self) -> float:
+        """Calculates the total cost of the order based on prices at time of purchase."""
+        return self.order.calculate_total()
+
+    def get_order_summary(self) -> dict:
+        """Returns a summary of the order."""
+        return self.order.get_order_summary()
+
+
+ASYNC_INVENTORY = Rule(AsyncInventory, TypeError, "Inventory must be an AsyncInventory instance.")
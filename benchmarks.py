@@ -0,0 +1,402 @@
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from code_normal import Product, DigitalProduct, PhysicalProduct, Inventory, Order, ChangeFeed
+from concurrent_inventory import ConcurrentInventory
+from async_inventory import AsyncInventory, AsyncOrder
+from persistence import PersistentInventory, MappedInventory
+from serialization import product_json, dump_inventory
+
+
+def timed(label: str, func, *args, **kwargs):
+    """Runs func once and prints its wall-clock time. Returns the result."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed * 1000:10.1f} ms")
+    return result
+
+
+def build_inventory(size: int, stock: int = 100) -> Inventory:
+    """Returns an inventory of size generic products with the given stock each."""
+    inventory = Inventory()
+    for i in range(size):
+        inventory.add_product(Product(f"Product {i}", 1.0 + i % 500, product_id=f"SKU-{i}", quantity=stock))
+    return inventory
+
+
+def bench_update_stock_many(rows: int = 100_000, size: int = 10_000) -> None:
+    """Compares per-item update_stock calls with one update_stock_many batch."""
+    changes = [(f"SKU-{i % size}", 1 if i % 2 else -1) for i in range(rows)]
+
+    def per_item(inventory):
+        for product_id, quantity_change in changes:
+            inventory.update_stock(product_id, quantity_change)
+
+    timed(f"update_stock x {rows}", per_item, build_inventory(size))
+    timed(f"update_stock_many({rows} rows)", build_inventory(size).update_stock_many, changes)
+
+
+def bench_add_products(size: int = 100_000) -> None:
+    """Compares constructing and adding products one by one with add_products."""
+    columns = {
+        "name": [f"Product {i}" for i in range(size)],
+        "price": [1.0 + i % 500 for i in range(size)],
+        "quantity": [i % 50 for i in range(size)],
+    }
+
+    def per_item(inventory):
+        for name, price, quantity in zip(columns["name"], columns["price"], columns["quantity"]):
+            inventory.add_product(Product(name, price, quantity=quantity))
+
+    timed(f"add_product x {size}", per_item, Inventory())
+    timed(f"add_products({size} rows)", Inventory().add_products, columns)
+
+
+class DictLayout:
+    """Holds a product's fields in a per-instance __dict__, as products did before __slots__."""
+
+
+def bytes_per_object(factory, count: int) -> float:
+    """Returns the average bytes allocated and retained per object built by factory."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def bench_product_memory(count: int = 50_000) -> None:
+    """Compares bytes per product for the slotted classes and the former __dict__ layout."""
+    factories = {
+        "Product": lambda i: Product(f"Product {i}", 9.99, quantity=i),
+        "DigitalProduct": lambda i: DigitalProduct(f"Ebook {i}", 9.99, "https://example.com/e", 5.5),
+        "PhysicalProduct": lambda i: PhysicalProduct(f"Box {i}", 9.99, 2.5, (40, 30, 5)),
+    }
+    fields = {
+        "Product": ("name", "price", "product_id", "quantity"),
+        "DigitalProduct": ("name", "price", "product_id", "quantity", "download_link", "file_size_mb"),
+        "PhysicalProduct": ("name", "price", "product_id", "quantity", "weight_kg", "shipping_dimensions"),
+    }
+    for label, factory in factories.items():
+        def as_dict_layout(i, factory=factory, names=fields[label]):
+            product = factory(i)
+            legacy = DictLayout()
+            legacy.__dict__.update({name: getattr(product, name) for name in names})
+            return legacy
+
+        dict_bytes = bytes_per_object(as_dict_layout, count)
+        slot_bytes = bytes_per_object(factory, count)
+        print(f"{label:<16} __dict__: {dict_bytes:7.1f} B   __slots__: {slot_bytes:7.1f} B   "
+              f"saved: {1 - slot_bytes / dict_bytes:5.1%}")
+
+
+def bench_concurrent_reserve(threads: int = 8, skus: int = 4, stock: int = 20_000) -> None:
+    """Stress test: threads race to reserve single units of a few hot SKUs until stock runs out."""
+    inventory = ConcurrentInventory()
+    for i in range(skus):
+        inventory.add_product(Product(f"Hot {i}", 5.0, product_id=f"HOT-{i}", quantity=stock))
+    reserved = [0] * threads
+
+    def worker(index):
+        product_id = f"HOT-{index % skus}"
+        while True:
+            try:
+                inventory.reserve(product_id, 1)
+            except ValueError:
+                return
+            reserved[index] += 1
+
+    def run():
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    timed(f"{threads} threads reserving {skus * stock} units", run)
+    oversold = sum(reserved) - skus * stock
+    print(f"reserved: {sum(reserved)}  oversold: {oversold}  "
+          f"remaining: {sum(inventory.get_stock_level(f'HOT-{i}') for i in range(skus))}  "
+          f"value consistent: {inventory.verify()}")
+    assert oversold == 0
+
+
+def bench_async_carts(carts: int = 10_000, skus: int = 200, lines: int = 3) -> None:
+    """Checks out concurrent simulated carts through AsyncOrder and counts the batched stock mutations."""
+    rng = random.Random(7)
+    cart_lines = [[f"SKU-{rng.randrange(skus)}" for _ in range(lines)] for _ in range(carts)]
+
+    async def checkout_all():
+        inventory = AsyncInventory(build_inventory(skus, stock=carts))
+        products = {product_id: inventory.get_product(product_id) for product_id in inventory.inventory.products}
+
+        async def checkout(product_ids):
+            order = AsyncOrder(inventory)
+            await order.add_items([(products[product_id], 1) for product_id in product_ids])
+
+        await asyncio.gather(*(checkout(product_ids) for product_ids in cart_lines))
+        return inventory
+
+    inventory = timed(f"{carts} concurrent async carts", asyncio.run, checkout_all())
+    print(f"reservations: {sum(len(set(ids)) for ids in cart_lines)}  "
+          f"stock mutations: {inventory.mutation_count}  value consistent: {inventory.inventory.verify()}")
+
+
+def bench_wal_throughput(mutations: int = 20_000, skus: int = 1_000, batch_sizes=(1, 8, 64, 512)) -> None:
+    """Measures logged update_stock calls per second for several fsync batch sizes, then times replay."""
+    with tempfile.TemporaryDirectory() as directory:
+        for batch_size in batch_sizes:
+            path = os.path.join(directory, f"wal-{batch_size}.log")
+            with PersistentInventory(path, fsync_batch=batch_size) as inventory:
+                for i in range(skus):
+                    inventory.add_product(Product(f"Product {i}", 5.0, product_id=f"SKU-{i}", quantity=10))
+                inventory.commit()
+                count = mutations if batch_size > 1 else mutations // 20
+                start = time.perf_counter()
+                for i in range(count):
+                    inventory.update_stock(f"SKU-{i % skus}", 1)
+                inventory.commit()
+                elapsed = time.perf_counter() - start
+            print(f"fsync every {batch_size:>4} records: {count / elapsed:12,.0f} mutations/s")
+        replayed = timed("replay of the last log", PersistentInventory, path)
+        replayed.close()
+
+
+def bench_snapshot_load(size: int = 200_000) -> None:
+    """Compares rebuilding an inventory by log replay with mapping a snapshot of it."""
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, "inventory.log")
+        snapshot_path = os.path.join(directory, "inventory.snap")
+        with PersistentInventory(log_path, fsync_batch=4096) as inventory:
+            inventory.add_products({
+                "product_id": [f"SKU-{i}" for i in range(size)],
+                "name": [f"Product {i}" for i in range(size)],
+                "price": [1.0 + i % 500 for i in range(size)],
+                "quantity": [i % 50 for i in range(size)],
+            })
+            inventory.snapshot(snapshot_path)
+
+        timed(f"replay log of {size} products", PersistentInventory, log_path).close()
+        mapped = timed(f"map snapshot of {size} products", MappedInventory, snapshot_path, log_path)
+        timed("1000 get_product calls on the snapshot",
+              lambda: [mapped.get_product(f"SKU-{i * 97 % size}") for i in range(1000)])
+        mapped.close()
+
+
+def bench_shipping_quotes(products: int = 2_000, rates: int = 40) -> None:
+    """Compares per-pair calculate_shipping_cost calls with one quote_shipping_costs matrix."""
+    rng = random.Random(17)
+    items = [PhysicalProduct(f"Parcel {i}", 10.0, rng.uniform(0.1, 30.0),
+                             (rng.randint(5, 120), rng.randint(5, 80), rng.randint(1, 60)))
+             for i in range(products)]
+    pairs = [(round(rng.uniform(0.5, 12.0), 2), rng.choice((4000, 5000, 6000))) for _ in range(rates)]
+
+    def scalar():
+        return [[item.calculate_shipping_cost(rate_per_kg, volumetric_factor) for rate_per_kg, volumetric_factor in pairs]
+                for item in items]
+
+    expected = timed(f"calculate_shipping_cost x {products * rates}", scalar)
+    quotes = timed(f"quote_shipping_costs({products} x {rates})", PhysicalProduct.quote_shipping_costs, items, pairs)
+    assert quotes == expected
+
+
+def bench_serialize(size: int = 100_000) -> None:
+    """Compares get_details() + json.dumps per product with the streaming serializer and dump_inventory."""
+    inventory = Inventory()
+    for i in range(size):
+        if i % 3 == 0:
+            product = DigitalProduct(f"Ebook {i}", 9.99, f"https://example.com/{i}", 2.5)
+        elif i % 3 == 1:
+            product = PhysicalProduct(f"Parcel {i}", 19.5, 1.25, (30, 20, 10), quantity=i % 40)
+        else:
+            product = Product(f"Product {i}", 1.0 + i % 500, quantity=i % 50)
+        inventory.add_product(product)
+    products = list(inventory.products.values())
+
+    def dict_path():
+        return [json.dumps(product.get_details(), separators=(",", ":")) for product in products]
+
+    def streaming_path():
+        return [product_json(product) for product in products]
+
+    def jsonl_via_dicts():
+        stream = io.BytesIO()
+        stream.write("".join(line + "\n" for line in dict_path()).encode("ascii"))
+        return stream
+
+    expected = timed(f"get_details + json.dumps x {size}", dict_path)
+    assert timed(f"product_json x {size}", streaming_path) == expected
+    whole = timed(f"JSON Lines via dicts ({size} products)", jsonl_via_dicts).getvalue()
+    stream = io.BytesIO()
+    timed(f"dump_inventory({size} products)", dump_inventory, inventory, stream)
+    assert stream.getvalue() == whole
+
+
+def bench_trusted_paths(size: int = 100_000, checkouts: int = 100_000) -> None:
+    """Compares validated public calls with the trusted paths used inside the library for bulk loads and checkout."""
+    def validated_load():
+        return [Product(f"Product {i}", 1.0 + i % 500, f"SKU-{i}", i % 50) for i in range(size)]
+
+    def trusted_load():
+        return [Product._from_trusted(f"Product {i}", 1.0 + i % 500, f"SKU-{i}", i % 50) for i in range(size)]
+
+    timed(f"Product() x {size}", validated_load)
+    timed(f"Product._from_trusted x {size}", trusted_load)
+
+    def checkout(reserve):
+        for i in range(checkouts):
+            reserve(f"SKU-{i % 1_000}", 1)
+
+    timed(f"Inventory.reserve x {checkouts}", checkout, build_inventory(1_000, checkouts).reserve)
+    timed(f"Inventory._reserve x {checkouts}", checkout, build_inventory(1_000, checkouts)._reserve)
+
+    inventory = build_inventory(1_000, checkouts)
+    products = list(inventory.products.values())
+
+    def add_items():
+        order = Order()
+        for i in range(checkouts):
+            order.add_item(products[i % 1_000], 1, inventory)
+        return order
+
+    order = timed(f"Order.add_item with inventory x {checkouts}", add_items)
+    assert order.count_items() == checkouts
+
+
+def bench_low_stock(size: int = 100_000, updates: int = 200_000, polls: int = 100) -> None:
+    """Compares polling for products below their reorder threshold by scanning with the reorder index."""
+    rng = random.Random(23)
+    inventory = build_inventory(size, stock=20)
+    thresholds = {}
+    for product_id in inventory.products:
+        thresholds[product_id] = rng.randint(5, 20)
+        inventory.set_reorder_threshold(product_id, thresholds[product_id])
+    alerts = []
+    inventory.add_reorder_listener(lambda product, threshold: alerts.append(product.product_id))
+    product_ids = list(inventory.products)
+    timed(f"update_stock x {updates} with reorder tracking", lambda: [
+        inventory.update_stock(product_id, -1) for product_id in rng.choices(product_ids, k=updates)
+        if inventory.products[product_id].quantity])
+
+    def scan():
+        for _ in range(polls):
+            low = [product for product_id, product in inventory.products.items()
+                   if product.quantity < thresholds[product_id]]
+        return low
+
+    def indexed():
+        for _ in range(polls):
+            low = inventory.get_low_stock_products()
+        return low
+
+    expected = timed(f"scan for low stock x {polls}", scan)
+    assert timed(f"get_low_stock_products() x {polls}", indexed) == expected
+    print(f"low stock: {len(expected)}  reorder alerts: {len(alerts)}")
+
+
+def bench_top_k(size: int = 200_000, k: int = 20, queries: int = 100) -> None:
+    """Compares sorting every product per top-k query with Inventory.top_k on its maintained indexes."""
+    rng = random.Random(24)
+    inventory = Inventory()
+    for i in range(size):
+        inventory.add_product(Product(f"Product {i}", round(rng.uniform(1.0, 500.0), 2), f"SKU-{i}", rng.randint(0, 1_000)))
+    rankings = {"price": lambda product: product.price, "quantity": lambda product: product.quantity,
+                "value": lambda product: product.price * product.quantity}
+
+    for key, ranking in rankings.items():
+        def by_sorting():
+            for _ in range(queries):
+                top = sorted(inventory.products.values(), key=ranking, reverse=True)[:k]
+            return top
+
+        def by_index():
+            for _ in range(queries):
+                top = inventory.top_k(key, k)
+            return top
+
+        expected = timed(f"sort for top {k} by {key} x {queries}", by_sorting)
+        assert timed(f"top_k({key!r}, {k}) x {queries}", by_index) == expected
+
+    product_ids = list(inventory.products)
+    timed(f"update_stock x {size} with top-k heaps", lambda: [
+        inventory.update_stock(product_id, 1) for product_id in rng.choices(product_ids, k=size)])
+
+
+def bench_change_feed(size: int = 100_000, mutations: int = 20_000, syncs: int = 20) -> None:
+    """Compares keeping a replica current by re-reading the inventory with following its change feed."""
+    rng = random.Random(25)
+    inventory = build_inventory(size)
+    inventory.change_feed = ChangeFeed(capacity=mutations)
+    product_ids = list(inventory.products)
+
+    def reread(replica, cursor):
+        replica.clear()
+        replica.update((product_id, (product.price, product.quantity))
+                       for product_id, product in inventory.products.items())
+        return cursor
+
+    def follow(replica, cursor):
+        for batch in inventory.change_feed.batches(cursor):
+            for event in batch:
+                price, quantity = replica[event.product_id]
+                if event.kind == "quantity":
+                    replica[event.product_id] = (price, event.value)
+                elif event.kind == "price":
+                    replica[event.product_id] = (event.value, quantity)
+            cursor = batch[-1].sequence
+        return cursor
+
+    for label, sync in (("re-read whole inventory", reread), ("follow change feed", follow)):
+        replica = {}
+        reread(replica, 0)
+        cursor = inventory.change_feed.sequence
+
+        def run():
+            nonlocal cursor
+            elapsed = 0.0
+            for _ in range(syncs):
+                for product_id in rng.choices(product_ids, k=mutations // syncs):
+                    inventory.update_stock(product_id, 1)
+                start = time.perf_counter()
+                cursor = sync(replica, cursor)
+                elapsed += time.perf_counter() - start
+            return elapsed
+
+        elapsed = run()
+        print(f"{label} x {syncs} syncs{'':<22} {elapsed * 1000:10.1f} ms")
+        assert replica == {product_id: (product.price, product.quantity)
+                           for product_id, product in inventory.products.items()}
+
+
+BENCHMARKS = {
+    "update_stock_many": bench_update_stock_many,
+    "add_products": bench_add_products,
+    "product_memory": bench_product_memory,
+    "concurrent_reserve": bench_concurrent_reserve,
+    "async_carts": bench_async_carts,
+    "wal_throughput": bench_wal_throughput,
+    "snapshot_load": bench_snapshot_load,
+    "shipping_quotes": bench_shipping_quotes,
+    "serialize": bench_serialize,
+    "trusted_paths": bench_trusted_paths,
+    "low_stock": bench_low_stock,
+    "top_k": bench_top_k,
+    "change_feed": bench_change_feed,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(f"== {name}")
+        BENCHMARKS[name]()
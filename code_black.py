@@ -1,15 +1,119 @@
 import uuid
+from abc import ABCMeta
+from collections import namedtuple
+
+class Rule:
+    """
+    Declarative check for one argument: values that are not instances of types, or for which
+    reject(value, *related) returns True, are refused with error(message). Related values are
+    the other arguments a cross-argument rule compares against. Library code that has already
+    checked its arguments calls the internal methods directly and skips the rules.
+    """
+    __slots__ = ("types", "error", "message", "reject")
+
+    def __init__(self, types, error: type, message: str, reject=None):
+        """Initializes the Rule."""
+        ...
+
+    def check(self, value, *related):
+        """Returns value if it passes the rule. Raises: the rule's error."""
+        ...
+
+    def violation(self, value, *related):
+        """Returns the rule's message if value breaks it, otherwise None."""
+        ...
+
+
+PRODUCT_NAME = Rule(str, TypeError, "Product name must be a non-empty string.")
+PRODUCT_PRICE = Rule((int, float), ValueError, "Product price must be a positive number.")
+OPTIONAL_PRODUCT_ID = Rule((str, type(None)), TypeError, "Product ID must be a string if provided.")
+PRODUCT_QUANTITY = Rule(int, ValueError, "Product quantity must be a non-negative integer.")
+DOWNLOAD_LINK = Rule(str, TypeError, "Download link must be a valid URL string starting with http:// or https://.")
+FILE_SIZE = Rule((int, float), ValueError, "File size must be a positive number.")
+WEIGHT = Rule((int, float), ValueError, "Weight must be a positive number.")
+SHIPPING_DIMENSIONS = Rule(tuple, TypeError,
+                           "Shipping dimensions must be a tuple of three positive numbers (length, width, height).")
+PRODUCT_ID = Rule(str, TypeError, "Product ID must be a string.")
+QUANTITY_CHANGE = Rule(int, TypeError, "Quantity change must be an integer.")
+POSITIVE_QUANTITY = Rule(int, ValueError, "Quantity must be a positive integer.")
+INITIAL_STOCK = Rule(int, ValueError, "Initial stock must be a non-negative integer.")
+DISCOUNT_PERCENTAGE = Rule((int, float), TypeError, "Discount percentage must be a number.")
+DISCOUNT_RANGE = Rule((int, float), ValueError, "Discount percentage must be between 0 and 100.")
+RATE_PER_KG = Rule((int, float), ValueError, "Rate per kg must be a positive number.")
+VOLUMETRIC_FACTOR = Rule(int, ValueError, "Volumetric factor must be a positive integer.")
+MIN_PRICE = Rule((int, float), ValueError, "Minimum price must be a non-negative number.")
+OPTIONAL_CUSTOMER_ID = Rule((str, type(None)), TypeError, "Customer ID must be a string if provided.")
+STOCK_THRESHOLD = Rule(int, ValueError, "Threshold must be a non-negative integer.")
+TOP_K_COUNT = Rule(int, ValueError, "K must be a non-negative integer.")
+FEED_CAPACITY = Rule(int, ValueError, "Change feed capacity must be a positive integer.")
+BATCH_LIMIT = Rule(int, ValueError, "Batch limit must be a positive integer.")
+SEQUENCE_NUMBER = Rule(int, ValueError, "Sequence number must be a non-negative integer.")
+ID_BLOCK_SIZE = Rule(int, ValueError, "Block size must be an integer of at least 16 bytes.")
+BASE_URL = Rule(str, TypeError, "Base URL must be a non-empty string.")
+SEARCH_TERM = Rule(str, TypeError, "Search term must be a string.")
+MAX_PRICE = Rule((int, float), ValueError, "Maximum price must be a number greater than or equal to minimum price.")
+ORDER_ID = Rule(str, TypeError, "Order ID must be a string.")
+OPTIONAL_ORDER_ID = Rule((str, type(None)), TypeError, "Order ID must be a string if provided.")
+QUANTITY_TO_REMOVE = Rule(int, ValueError, "Quantity to remove must be a positive integer.")
+NEW_STATUS = Rule(str, TypeError, "New status must be a string.")
+ORDER_STATUS = Rule(str, TypeError, "Status must be a string.")
+
+
+class IdGenerator:
+    """
+    Generates random version 4 UUID strings, like str(uuid.uuid4()). Random bytes are read from
+    os.urandom in blocks of block_size bytes instead of once per ID, and forked children drop
+    the parent's unused block so the two processes never hand out the same IDs.
+    """
+    def __init__(self, block_size: int = 4096):
+        """Initializes the IdGenerator. Raises: ValueError."""
+        ...
+
+    def __call__(self) -> str:
+        """Returns a new random ID."""
+        ...
+
+    def random_hex(self, length: int) -> str:
+        """Returns length random hexadecimal digits from the prefetched block."""
+        ...
+
+
+class TimeOrderedIdGenerator(IdGenerator):
+    """
+    Generates version 7 UUID strings: a 48-bit millisecond timestamp, a 12-bit sequence number
+    for IDs made within the same millisecond, then random bits. IDs from one generator sort in
+    the order they were made, as strings and as UUIDs, which keeps index inserts at the end.
+    """
+    def __call__(self) -> str:
+        """Returns a new ID greater than every ID this generator returned before."""
+        ...
+
+
+class ProductDetails(dict):
+    """
+    Read-only dict of product details, as returned by get_details. Being a dict, it is accepted
+    by json.dumps and pickle; methods that would change it raise TypeError.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        """Copies and pickles the details as a new read-only dict."""
+        ...
+
 
 class Product:
     """
     Represents a generic product in the system.
     """
+    __slots__ = ("_name", "_price", "product_id", "_quantity", "_inventories", "_details", "__weakref__")
+    id_generator = IdGenerator()
+
     def __init__(self, name: str, price: float, product_id: str = None, quantity: int = 0):
         """Initializes a Product instance. Raises: TypeError, ValueError."""
         ...
 
-    def get_details(self) -> dict:
-        """Returns a dictionary with product details."""
+    def get_details(self) -> ProductDetails:
+        """Returns a read-only dict with product details, rebuilt only after a field has changed."""
         ...
 
     def update_quantity(self, change: int) -> None:
@@ -20,6 +124,10 @@ class Product:
         """Applies a discount to the product's price. Raises: TypeError, ValueError."""
         ...
 
+    def __reduce__(self):
+        """Copies and pickles the product's fields without the inventories holding it or its cached values."""
+        ...
+
     def __repr__(self):
         ...
 
@@ -27,15 +135,13 @@ class DigitalProduct(Product):
     """
     Represents a digital product, inheriting from Product.
     """
+    __slots__ = ("_download_link", "_file_size_mb")
+
     def __init__(self, name: str, price: float, download_link: str, 
                  file_size_mb: float, product_id: str = None, quantity: int = 1):
         """Initializes a DigitalProduct. Raises: TypeError, ValueError."""
         ...
 
-    def get_details(self) -> dict:
-        """Returns a dictionary with digital product details."""
-        ...
-
     def generate_new_download_link(self, base_url: str) -> str:
         """Generates a new pseudo-unique download link. Raises: TypeError."""
         ...
@@ -44,39 +150,92 @@ class DigitalProduct(Product):
         ...
 
 
+class ShippingDimensions(tuple):
+    """
+    Immutable (length, width, height) of a physical product in centimetres.
+    """
+    __slots__ = ()
+
+    def __new__(cls, dimensions: tuple):
+        """Validates and wraps a tuple of three positive numbers. Raises: TypeError."""
+        ...
+
+    @property
+    def volume(self) -> float:
+        """Returns length * width * height."""
+        ...
+
+
 class PhysicalProduct(Product):
     """
     Represents a physical product, inheriting from Product.
     """
+    __slots__ = ("_weight_kg", "_shipping_dimensions", "_volume", "_chargeable_weights")
+
     def __init__(self, name: str, price: float, weight_kg: float, 
                  shipping_dimensions: tuple, product_id: str = None, quantity: int = 0):
         """Initializes a PhysicalProduct. Raises: TypeError, ValueError."""
         ...
 
-    def get_details(self) -> dict:
-        """Returns a dictionary with physical product details."""
-        ...
-
     def calculate_shipping_cost(self, rate_per_kg: float, volumetric_factor: int = 5000) -> float:
         """Calculates shipping cost. Raises: ValueError."""
         ...
 
+    @staticmethod
+    def quote_shipping_costs(products, rates) -> list:
+        """Quotes every product against every (rate_per_kg, volumetric_factor) pair, rounded like calculate_shipping_cost. Returns an N x M list of rows. Raises: TypeError, ValueError."""
+        ...
+
     def __repr__(self):
         ...
 
 
-class Inventory:
+ChangeEvent = namedtuple("ChangeEvent", ("sequence", "kind", "product_id", "value"))
+
+
+class ChangeFeed:
     """
-    Manages a collection of products.
+    In-process stream of inventory changes, attached with inventory.change_feed = ChangeFeed().
+    Every change is a ChangeEvent with the next sequence number: kind "add" carries the product's
+    details as a read-only dict, "remove" carries None, and "quantity", "price" and "name"
+    carry the new value, so replaying events in order converges on the inventory's state.
+    The newest capacity events are kept.
     """
-    def __init__(self):
-        """Initializes the Inventory."""
+    KINDS = ("add", "remove", "quantity", "price", "name")
+
+    def __init__(self, capacity: int = 65536):
+        """Initializes the ChangeFeed. Raises: ValueError."""
+        ...
+
+    def read(self, after: int = 0, limit: int = 1000) -> list:
+        """Returns up to limit events with sequence numbers greater than after, oldest first. Raises: ValueError."""
+        ...
+
+    def batches(self, after: int = 0, limit: int = 1000):
+        """Yields lists of up to limit events after a sequence number until the feed is caught up. Raises: ValueError."""
+        ...
+
+
+class Inventory(metaclass=ABCMeta):
+    """
+    Manages a collection of products. Other stores that support the calls orders make on
+    an inventory register themselves with Inventory.register.
+    """
+    PRODUCT_TYPES = {"GenericProduct": Product, "DigitalProduct": DigitalProduct, "PhysicalProduct": PhysicalProduct}
+    TOP_K_KEYS = ("price", "quantity", "value")
+
+    def __init__(self, exact: bool = False):
+        """Initializes the Inventory. Exact mode keeps the running value as a Decimal."""
         ...
 
     def add_product(self, product: Product, initial_stock: int = None) -> None:
         """Adds a product to the inventory. Raises: TypeError, ValueError."""
         ...
 
+    def add_products(self, records) -> dict:
+        """Bulk-loads products from a dict of columns or an iterable of row dicts. Raises: TypeError, ValueError."""
+        ...
+
     def remove_product(self, product_id: str) -> Product:
         """Removes a product from inventory by ID. Raises: TypeError, KeyError."""
         ...
@@ -89,9 +248,24 @@ class Inventory:
         """Updates stock quantity of a product. Raises: TypeError, KeyError, ValueError."""
         ...
 
+    def reserve(self, product_id: str, quantity: int) -> None:
+        """Takes quantity units of a product out of stock. Raises: TypeError, KeyError, ValueError."""
+        ...
+
+    def release(self, product_id: str, quantity: int) -> None:
+        """Returns quantity reserved units of a product to stock. Raises: TypeError, KeyError, ValueError."""
+        ...
+
+    def update_stock_many(self, changes) -> list:
+        """Applies (product_id, quantity_change) pairs all-or-nothing. Returns the rejected rows."""
+        ...
 
     def get_total_inventory_value(self) -> float:
-        """Calculates the total value of all products in stock."""
+        """Returns the total value of all products in stock."""
+        ...
+
+    def verify(self) -> bool:
+        """Checks the running inventory value against a full recomputation, resyncing it on mismatch."""
         ...
 
     def find_products_by_name(self, search_term: str, case_sensitive: bool = False) -> list:
@@ -106,12 +280,47 @@ class Inventory:
         """Gets stock level for a product. Raises: TypeError, KeyError."""
         ...
 
+    def set_reorder_threshold(self, product_id: str, threshold: int = None) -> None:
+        """Sets the stock level below which a product needs reordering; None clears it. Raises: TypeError, KeyError, ValueError."""
+        ...
+
+    def get_reorder_threshold(self, product_id: str) -> int:
+        """Returns a product's reorder threshold, or None if it has none. Raises: TypeError, KeyError."""
+        ...
+
+    def get_low_stock_products(self, threshold: int = None) -> list:
+        """Returns products whose quantity is below threshold, or below their own reorder threshold when none is given. Raises: ValueError."""
+        ...
+
+    def top_k(self, key: str, k: int, largest: bool = True) -> list:
+        """Returns the k products with the largest (or smallest) price, quantity or value, ties in the order they were added. Raises: ValueError."""
+        ...
+
+    def add_reorder_listener(self, listener) -> None:
+        """Registers listener(product, threshold), called once a change is fully applied if it took a product below its reorder threshold; exceptions are logged. Raises: TypeError."""
+        ...
+
+    def remove_reorder_listener(self, listener) -> None:
+        """Unregisters a reorder listener. Raises: ValueError."""
+        ...
+
+
+def _status_transitions(statuses: list, restricted: dict) -> dict:
+    """Returns the (current status, requested status) -> next status table."""
+    ...
+
 
 class Order:
     """
     Represents a customer order.
     """
     ALLOWED_STATUSES = ["pending", "awaiting_payment", "processing", "shipped", "delivered", "cancelled", "refunded"]
+    STATUSES = frozenset(ALLOWED_STATUSES)
+    FINAL_STATUSES = frozenset(["shipped", "delivered", "cancelled", "refunded"])
+    STATUS_TRANSITIONS = _status_transitions(
+        ALLOWED_STATUSES, {"delivered": ("delivered", "refunded"), "cancelled": ("cancelled",)}
+    )
+    id_generator = IdGenerator()
 
     def __init__(self, order_id: str = None, customer_id: str = None):
         """Initializes a new Order. Raises: TypeError."""
@@ -121,6 +330,10 @@ class Order:
         """Adds an item to the order. Raises: RuntimeError, TypeError, ValueError, KeyError."""
         ...
 
+    def add_items(self, lines, inventory: Inventory = None) -> None:
+        """Adds (product, quantity) lines, reserving all stock at once. Raises: RuntimeError, TypeError, ValueError, KeyError."""
+        ...
+
     def remove_item(self, product_id: str, quantity_to_remove: int, inventory: Inventory = None) -> None:
         """Removes item quantity from order. Raises: RuntimeError, TypeError, ValueError, KeyError."""
         ...
@@ -130,6 +343,10 @@ class Order:
         """Calculates the total cost of the order based on prices at time of purchase."""
         ...
 
+    def count_items(self) -> int:
+        """Returns the total number of units in the order."""
+        ...
+
     def update_status(self, new_status: str) -> None:
         """Updates the order status. Raises: TypeError, ValueError."""
         ...
@@ -142,5 +359,49 @@ class Order:
         """Marks order as finalized. Raises: ValueError."""
         ...
 
+    def __reduce__(self):
+        """Copies and pickles the order's fields without the order books holding it."""
+        ...
+
     def __repr__(self):
-        ...
\ No newline at end of file
+        ...
+
+
+class OrderBook:
+    """
+    Stores orders with secondary indexes on customer ID and status.
+    """
+    def __init__(self):
+        """Initializes the OrderBook."""
+        ...
+
+    def add_order(self, order: Order) -> None:
+        """Adds an order to the book. Raises: TypeError, ValueError."""
+        ...
+
+    def remove_order(self, order_id: str) -> Order:
+        """Removes an order from the book by ID. Raises: TypeError, KeyError."""
+        ...
+
+    def get_order(self, order_id: str) -> Order:
+        """Retrieves an order by ID. Raises: TypeError, KeyError."""
+        ...
+
+    def get_orders_by_customer(self, customer_id: str) -> list:
+        """Returns a customer's orders in the order they were added. Raises: TypeError."""
+        ...
+
+    def get_orders_by_status(self, status: str) -> list:
+        """Returns the orders currently in a status, oldest status change first. Raises: TypeError, ValueError."""
+        ...
+
+    def apply_status_events(self, events) -> list:
+        """Applies (order_id, new_status) events in one pass. Returns the rejected events."""
+        ...
+
+
+# Rules on instances of the classes above.
+PRODUCT_ITEM = Rule(Product, TypeError, "Item to add must be an instance of Product.")
+QUOTED_PRODUCT = Rule(PhysicalProduct, TypeError, "Products to quote must be instances of PhysicalProduct.")
+INVENTORY = Rule(Inventory, TypeError, "Inventory must be an Inventory instance.")
+ORDER_ITEM = Rule(Order, TypeError, "Item to add must be an instance of Order.")
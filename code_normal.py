@@ -1,26 +1,318 @@
-import uuid
+import bisect
+import contextlib
+import copyreg
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+import weakref
+from abc import ABCMeta
+from collections import deque, namedtuple
+from decimal import Decimal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NAME_INDEX_GRAM_SIZE = 3
+
+_logger = logging.getLogger(__name__)
+
+
+def _name_grams(text: str) -> set:
+    """Returns every substring of text up to NAME_INDEX_GRAM_SIZE characters long."""
+    return {text[start:start + size]
+            for size in range(1, NAME_INDEX_GRAM_SIZE + 1)
+            for start in range(len(text) - size + 1)}
+
+
+def _as_number(value):
+    """Parses numeric strings, as read from CSV files; other values pass through unchanged."""
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _as_integer(value):
+    """Parses integer strings, as read from CSV files; other values pass through unchanged."""
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _as_dimensions(value):
+    """Parses 'LxWxH' or 'L,W,H' strings and lists into a tuple of numbers; other values pass through."""
+    if isinstance(value, str):
+        parts = [_as_number(part.strip()) for part in value.replace("x", ",").split(",")]
+        return tuple(parts)
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class Rule:
+    """
+    Declarative check for one argument: values that are not instances of types, or for which
+    reject(value, *related) returns True, are refused with error(message). Related values are
+    the other arguments a cross-argument rule compares against. Library code that has already
+    checked its arguments calls the internal methods directly and skips the rules.
+    """
+    __slots__ = ("types", "error", "message", "reject")
+
+    def __init__(self, types, error: type, message: str, reject=None):
+        """Initializes the Rule."""
+        self.types = types
+        self.error = error
+        self.message = message
+        self.reject = reject
+
+    def check(self, value, *related):
+        """Returns value if it passes the rule. Raises: the rule's error."""
+        if not isinstance(value, self.types) or (self.reject is not None and self.reject(value, *related)):
+            raise self.error(self.message)
+        return value
+
+    def violation(self, value, *related):
+        """Returns the rule's message if value breaks it, otherwise None."""
+        if not isinstance(value, self.types) or (self.reject is not None and self.reject(value, *related)):
+            return self.message
+        return None
+
+
+PRODUCT_NAME = Rule(str, TypeError, "Product name must be a non-empty string.", lambda name: not name.strip())
+PRODUCT_PRICE = Rule((int, float), ValueError, "Product price must be a positive number.", lambda price: price <= 0)
+OPTIONAL_PRODUCT_ID = Rule((str, type(None)), TypeError, "Product ID must be a string if provided.")
+PRODUCT_QUANTITY = Rule(int, ValueError, "Product quantity must be a non-negative integer.", lambda quantity: quantity < 0)
+DOWNLOAD_LINK = Rule(str, TypeError, "Download link must be a valid URL string starting with http:// or https://.",
+                     lambda link: not link.startswith(("http://", "https://")))
+FILE_SIZE = Rule((int, float), ValueError, "File size must be a positive number.", lambda size: size <= 0)
+WEIGHT = Rule((int, float), ValueError, "Weight must be a positive number.", lambda weight: weight <= 0)
+SHIPPING_DIMENSIONS = Rule(tuple, TypeError,
+                           "Shipping dimensions must be a tuple of three positive numbers (length, width, height).",
+                           lambda dimensions: len(dimensions) != 3 or not all(
+                               isinstance(dim, (int, float)) and dim > 0 for dim in dimensions))
+PRODUCT_ID = Rule(str, TypeError, "Product ID must be a string.")
+QUANTITY_CHANGE = Rule(int, TypeError, "Quantity change must be an integer.")
+POSITIVE_QUANTITY = Rule(int, ValueError, "Quantity must be a positive integer.", lambda quantity: quantity <= 0)
+INITIAL_STOCK = Rule(int, ValueError, "Initial stock must be a non-negative integer.", lambda stock: stock < 0)
+DISCOUNT_PERCENTAGE = Rule((int, float), TypeError, "Discount percentage must be a number.")
+DISCOUNT_RANGE = Rule((int, float), ValueError, "Discount percentage must be between 0 and 100.",
+                      lambda percentage: not 0 <= percentage <= 100)
+RATE_PER_KG = Rule((int, float), ValueError, "Rate per kg must be a positive number.", lambda rate: rate <= 0)
+VOLUMETRIC_FACTOR = Rule(int, ValueError, "Volumetric factor must be a positive integer.", lambda factor: factor <= 0)
+MIN_PRICE = Rule((int, float), ValueError, "Minimum price must be a non-negative number.", lambda price: price < 0)
+OPTIONAL_CUSTOMER_ID = Rule((str, type(None)), TypeError, "Customer ID must be a string if provided.")
+STOCK_THRESHOLD = Rule(int, ValueError, "Threshold must be a non-negative integer.", lambda threshold: threshold < 0)
+TOP_K_COUNT = Rule(int, ValueError, "K must be a non-negative integer.", lambda k: k < 0)
+FEED_CAPACITY = Rule(int, ValueError, "Change feed capacity must be a positive integer.", lambda capacity: capacity <= 0)
+BATCH_LIMIT = Rule(int, ValueError, "Batch limit must be a positive integer.", lambda limit: limit <= 0)
+SEQUENCE_NUMBER = Rule(int, ValueError, "Sequence number must be a non-negative integer.", lambda sequence: sequence < 0)
+ID_BLOCK_SIZE = Rule(int, ValueError, "Block size must be an integer of at least 16 bytes.", lambda size: size < 16)
+BASE_URL = Rule(str, TypeError, "Base URL must be a non-empty string.", lambda url: not url.strip())
+SEARCH_TERM = Rule(str, TypeError, "Search term must be a string.")
+MAX_PRICE = Rule((int, float), ValueError, "Maximum price must be a number greater than or equal to minimum price.",
+                 lambda max_price, min_price: max_price < min_price)
+ORDER_ID = Rule(str, TypeError, "Order ID must be a string.")
+OPTIONAL_ORDER_ID = Rule((str, type(None)), TypeError, "Order ID must be a string if provided.")
+QUANTITY_TO_REMOVE = Rule(int, ValueError, "Quantity to remove must be a positive integer.", lambda quantity: quantity <= 0)
+NEW_STATUS = Rule(str, TypeError, "New status must be a string.")
+ORDER_STATUS = Rule(str, TypeError, "Status must be a string.")
+
+_UUID_VARIANTS = {digit: "89ab"[int(digit, 16) & 3] for digit in "0123456789abcdef"}
+
+_ID_GENERATORS = weakref.WeakSet()
+
+
+class IdGenerator:
+    """
+    Generates random version 4 UUID strings, like str(uuid.uuid4()). Random bytes are read from
+    os.urandom in blocks of block_size bytes instead of once per ID, and forked children drop
+    the parent's unused block so the two processes never hand out the same IDs.
+    """
+    def __init__(self, block_size: int = 4096):
+        """Initializes the IdGenerator. Raises: ValueError."""
+        self.block_size = ID_BLOCK_SIZE.check(block_size)
+        self._reset()
+        _ID_GENERATORS.add(self)
+
+    def __call__(self) -> str:
+        """Returns a new random ID."""
+        digits = self.random_hex(32)
+        return (f"{digits[:8]}-{digits[8:12]}-4{digits[13:16]}-"
+                f"{_UUID_VARIANTS[digits[16]]}{digits[17:20]}-{digits[20:]}")
+
+    def random_hex(self, length: int) -> str:
+        """Returns length random hexadecimal digits from the prefetched block."""
+        with self._lock:
+            end = self._offset + length
+            if end > len(self._digits):
+                self._digits = os.urandom(max(self.block_size, (length + 1) // 2)).hex()
+                end = length
+            digits = self._digits[end - length:end]
+            self._offset = end
+        return digits
+
+    def _reset(self) -> None:
+        """Discards the prefetched block."""
+        self._lock = threading.Lock()
+        self._digits = ""
+        self._offset = 0
+
+
+class TimeOrderedIdGenerator(IdGenerator):
+    """
+    Generates version 7 UUID strings: a 48-bit millisecond timestamp, a 12-bit sequence number
+    for IDs made within the same millisecond, then random bits. IDs from one generator sort in
+    the order they were made, as strings and as UUIDs, which keeps index inserts at the end.
+    """
+    def __call__(self) -> str:
+        """Returns a new ID greater than every ID this generator returned before."""
+        digits = self.random_hex(16)
+        with self._clock_lock:
+            timestamp = time.time_ns() // 1_000_000
+            if timestamp <= self._last_timestamp:
+                timestamp = self._last_timestamp
+                self._sequence += 1
+                if self._sequence > 0xFFF:
+                    timestamp += 1
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_timestamp = timestamp
+            sequence = self._sequence
+        clock = f"{timestamp:012x}"
+        return (f"{clock[:8]}-{clock[8:]}-7{sequence:03x}-"
+                f"{_UUID_VARIANTS[digits[0]]}{digits[1:4]}-{digits[4:]}")
+
+    def _reset(self) -> None:
+        """Discards the prefetched block and keeps the clock of the last ID."""
+        super()._reset()
+        self._clock_lock = threading.Lock()
+        if not hasattr(self, "_last_timestamp"):
+            self._last_timestamp = -1
+            self._sequence = 0
+
+
+def _reset_id_generators() -> None:
+    """Makes every live ID generator discard the block it inherited from the parent process."""
+    for generator in list(_ID_GENERATORS):
+        generator._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_id_generators)
+
+_download_tokens = IdGenerator()
+
+
+class ProductDetails(dict):
+    """
+    Read-only dict of product details, as returned by get_details. Being a dict, it is accepted
+    by json.dumps and pickle; methods that would change it raise TypeError.
+    """
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Product details are read-only.")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        """Copies and pickles the details as a new read-only dict."""
+        return type(self), (dict(self),)
+
 
 class Product:
     """
     Represents a generic product in the system.
     """
+    __slots__ = ("_name", "_price", "product_id", "_quantity", "_inventories", "_details", "__weakref__")
+    id_generator = IdGenerator()
+    _UNCOPIED_FIELDS = {"_inventories": (), "_details": None}
+
     def __init__(self, name: str, price: float, product_id: str = None, quantity: int = 0):
         """Initializes a Product instance. Raises: TypeError, ValueError."""
-        if not isinstance(name, str) or not name.strip():
-            raise TypeError("Product name must be a non-empty string.")
-        if not isinstance(price, (int, float)) or price <= 0:
-            raise ValueError("Product price must be a positive number.")
-        if product_id is not None and not isinstance(product_id, str):
-            raise TypeError("Product ID must be a string if provided.")
-        if not isinstance(quantity, int) or quantity < 0:
-            raise ValueError("Product quantity must be a non-negative integer.")
+        PRODUCT_NAME.check(name)
+        PRODUCT_PRICE.check(price)
+        OPTIONAL_PRODUCT_ID.check(product_id)
+        PRODUCT_QUANTITY.check(quantity)
 
+        self._inventories = ()
+        self._details = None
         self.name = name.strip()
         self.price = float(price)
-        self.product_id = product_id if product_id else str(uuid.uuid4())
+        self.product_id = product_id if product_id else type(self).id_generator()
         self.quantity = quantity
 
-    def get_details(self) -> dict:
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, value: str) -> None:
+        old_value = getattr(self, "_name", None)
+        self._name = value
+        self._details = None
+        self._notify_inventories("name", old_value)
+
+    @property
+    def price(self) -> float:
+        return self._price
+
+    @price.setter
+    def price(self, value: float) -> None:
+        old_value = getattr(self, "_price", None)
+        self._price = value
+        self._details = None
+        self._notify_inventories("price", old_value)
+
+    @property
+    def quantity(self) -> int:
+        return self._quantity
+
+    @quantity.setter
+    def quantity(self, value: int) -> None:
+        old_value = getattr(self, "_quantity", None)
+        self._quantity = value
+        self._details = None
+        self._notify_inventories("quantity", old_value)
+
+    @classmethod
+    def _from_trusted(cls, name: str, price: float, product_id: str, quantity: int, **fields) -> "Product":
+        """Builds a product from already validated values without re-checking them."""
+        product = cls.__new__(cls)
+        product._inventories = ()
+        product._details = None
+        product._name = name
+        product._price = price
+        product.product_id = product_id
+        product._quantity = quantity
+        for field, value in fields.items():
+            setattr(product, field, value)
+        return product
+
+    def _notify_inventories(self, field: str, old_value) -> None:
+        """Tells every inventory holding this product that a field has changed."""
+        for inventory in self._inventories:
+            inventory._on_product_changed(self, field, old_value)
+
+    def get_details(self) -> ProductDetails:
+        """Returns a read-only dict with product details, rebuilt only after a field has changed."""
+        details = self._details
+        if details is None:
+            details = self._details = ProductDetails(self._build_details())
+        return details
+
+    def _build_details(self) -> dict:
         """Returns a dictionary with product details."""
         return {
             "product_id": self.product_id,
@@ -32,20 +324,28 @@ class Product:
 
     def update_quantity(self, change: int) -> None:
         """Updates the product quantity. Raises: TypeError, ValueError."""
-        if not isinstance(change, int):
-            raise TypeError("Quantity change must be an integer.")
+        QUANTITY_CHANGE.check(change)
         if self.quantity + change < 0:
             raise ValueError("Quantity cannot be reduced below zero.")
         self.quantity += change
 
     def apply_discount(self, discount_percentage: float) -> None:
         """Applies a discount to the product's price. Raises: TypeError, ValueError."""
-        if not isinstance(discount_percentage, (int, float)):
-            raise TypeError("Discount percentage must be a number.")
-        if not 0 <= discount_percentage <= 100:
-            raise ValueError("Discount percentage must be between 0 and 100.")
-        self.price -= self.price * (discount_percentage / 100.0)
-        self.price = round(self.price, 2)
+        DISCOUNT_PERCENTAGE.check(discount_percentage)
+        DISCOUNT_RANGE.check(discount_percentage)
+        self.price = round(self.price - self.price * (discount_percentage / 100.0), 2)
+
+    def __reduce__(self):
+        """Copies and pickles the product's fields without the inventories holding it or its cached values."""
+        fields = {}
+        for cls in type(self).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            for slot in (slots,) if isinstance(slots, str) else slots:
+                if slot != "__weakref__" and slot not in self._UNCOPIED_FIELDS and hasattr(self, slot):
+                    fields[slot] = getattr(self, slot)
+        fields.update(getattr(self, "__dict__", {}))
+        fields.update(self._UNCOPIED_FIELDS)
+        return copyreg.__newobj__, (type(self),), (None, fields)
 
     def __repr__(self):
         return f"Product(name='{self.name}', price={self.price}, id='{self.product_id}', quantity={self.quantity})"
@@ -54,21 +354,39 @@ class DigitalProduct(Product):
     """
     Represents a digital product, inheriting from Product.
     """
+    __slots__ = ("_download_link", "_file_size_mb")
+
     def __init__(self, name: str, price: float, download_link: str, 
                  file_size_mb: float, product_id: str = None, quantity: int = 1):
         """Initializes a DigitalProduct. Raises: TypeError, ValueError."""
         super().__init__(name, price, product_id, quantity)
-        if not isinstance(download_link, str) or not download_link.startswith(("http://", "https://")):
-            raise TypeError("Download link must be a valid URL string starting with http:// or https://.")
-        if not isinstance(file_size_mb, (int, float)) or file_size_mb <= 0:
-            raise ValueError("File size must be a positive number.")
+        DOWNLOAD_LINK.check(download_link)
+        FILE_SIZE.check(file_size_mb)
 
         self.download_link = download_link
         self.file_size_mb = float(file_size_mb)
 
-    def get_details(self) -> dict:
+    @property
+    def download_link(self) -> str:
+        return self._download_link
+
+    @download_link.setter
+    def download_link(self, value: str) -> None:
+        self._download_link = value
+        self._details = None
+
+    @property
+    def file_size_mb(self) -> float:
+        return self._file_size_mb
+
+    @file_size_mb.setter
+    def file_size_mb(self, value: float) -> None:
+        self._file_size_mb = value
+        self._details = None
+
+    def _build_details(self) -> dict:
         """Returns a dictionary with digital product details."""
-        details = super().get_details()
+        details = super()._build_details()
         details.update({
             "download_link": self.download_link,
             "file_size_mb": self.file_size_mb,
@@ -78,9 +396,8 @@ class DigitalProduct(Product):
 
     def generate_new_download_link(self, base_url: str) -> str:
         """Generates a new pseudo-unique download link. Raises: TypeError."""
-        if not isinstance(base_url, str) or not base_url.strip():
-            raise TypeError("Base URL must be a non-empty string.")
-        new_token = str(uuid.uuid4()).split('-')[0]
+        BASE_URL.check(base_url)
+        new_token = _download_tokens.random_hex(8)
         self.download_link = f"{base_url.rstrip('/')}/{self.product_id}/download_{new_token}"
         return self.download_link
 
@@ -88,26 +405,82 @@ class DigitalProduct(Product):
         return f"DigitalProduct(name='{self.name}', price={self.price}, id='{self.product_id}', link='{self.download_link}')"
 
 
+class ShippingDimensions(tuple):
+    """
+    Immutable (length, width, height) of a physical product in centimetres.
+    """
+    __slots__ = ()
+
+    def __new__(cls, dimensions: tuple):
+        """Validates and wraps a tuple of three positive numbers. Raises: TypeError."""
+        if isinstance(dimensions, ShippingDimensions):
+            return dimensions
+        return super().__new__(cls, SHIPPING_DIMENSIONS.check(dimensions))
+
+    @classmethod
+    def _from_trusted(cls, dimensions: tuple) -> "ShippingDimensions":
+        """Wraps already validated dimensions without re-checking them."""
+        if isinstance(dimensions, ShippingDimensions):
+            return dimensions
+        return super().__new__(cls, dimensions)
+
+    @property
+    def volume(self) -> float:
+        """Returns length * width * height."""
+        return self[0] * self[1] * self[2]
+
+
 class PhysicalProduct(Product):
     """
     Represents a physical product, inheriting from Product.
     """
+    __slots__ = ("_weight_kg", "_shipping_dimensions", "_volume", "_chargeable_weights")
+    _UNCOPIED_FIELDS = {**Product._UNCOPIED_FIELDS, "_chargeable_weights": None}
+
     def __init__(self, name: str, price: float, weight_kg: float, 
                  shipping_dimensions: tuple, product_id: str = None, quantity: int = 0):
         """Initializes a PhysicalProduct. Raises: TypeError, ValueError."""
         super().__init__(name, price, product_id, quantity)
-        if not isinstance(weight_kg, (int, float)) or weight_kg <= 0:
-            raise ValueError("Weight must be a positive number.")
-        if not (isinstance(shipping_dimensions, tuple) and len(shipping_dimensions) == 3 and
-                all(isinstance(dim, (int, float)) and dim > 0 for dim in shipping_dimensions)):
-            raise TypeError("Shipping dimensions must be a tuple of three positive numbers (length, width, height).")
+        WEIGHT.check(weight_kg)
 
-        self.weight_kg = float(weight_kg)
         self.shipping_dimensions = shipping_dimensions
+        self.weight_kg = float(weight_kg)
+
+    @classmethod
+    def _from_trusted(cls, name: str, price: float, product_id: str, quantity: int,
+                      weight_kg: float, shipping_dimensions: tuple) -> "PhysicalProduct":
+        """Builds a physical product from already validated values without re-checking them."""
+        product = super()._from_trusted(name, price, product_id, quantity)
+        product._weight_kg = weight_kg
+        product._shipping_dimensions = ShippingDimensions._from_trusted(shipping_dimensions)
+        product._volume = product._shipping_dimensions.volume
+        product._chargeable_weights = None
+        return product
+
+    @property
+    def weight_kg(self) -> float:
+        return self._weight_kg
 
-    def get_details(self) -> dict:
+    @weight_kg.setter
+    def weight_kg(self, value: float) -> None:
+        self._weight_kg = value
+        self._chargeable_weights = None
+        self._details = None
+
+    @property
+    def shipping_dimensions(self) -> ShippingDimensions:
+        return self._shipping_dimensions
+
+    @shipping_dimensions.setter
+    def shipping_dimensions(self, value: tuple) -> None:
+        self._shipping_dimensions = ShippingDimensions(value)
+        self._volume = self._shipping_dimensions.volume
+        self._chargeable_weights = None
+        self._details = None
+
+    def _build_details(self) -> dict:
         """Returns a dictionary with physical product details."""
-        details = super().get_details()
+        details = super()._build_details()
         details.update({
             "weight_kg": self.weight_kg,
             "shipping_dimensions_cm": self.shipping_dimensions,
@@ -117,80 +490,437 @@ class PhysicalProduct(Product):
 
     def calculate_shipping_cost(self, rate_per_kg: float, volumetric_factor: int = 5000) -> float:
         """Calculates shipping cost. Raises: ValueError."""
-        if not isinstance(rate_per_kg, (int, float)) or rate_per_kg <= 0:
-            raise ValueError("Rate per kg must be a positive number.")
-        if not isinstance(volumetric_factor, int) or volumetric_factor <= 0:
-            raise ValueError("Volumetric factor must be a positive integer.")
-            
-        volumetric_weight = (self.shipping_dimensions[0] * self.shipping_dimensions[1] * self.shipping_dimensions[2]) / volumetric_factor
-        chargeable_weight = max(self.weight_kg, volumetric_weight)
-        cost = chargeable_weight * rate_per_kg
+        RATE_PER_KG.check(rate_per_kg)
+        VOLUMETRIC_FACTOR.check(volumetric_factor)
+
+        cost = self._chargeable_weight(volumetric_factor) * rate_per_kg
         return round(cost, 2)
 
+    def _chargeable_weight(self, volumetric_factor: int) -> float:
+        """Returns the greater of the actual and volumetric weight, cached per volumetric factor."""
+        weights = self._chargeable_weights
+        if weights is None:
+            weights = self._chargeable_weights = {}
+        weight = weights.get(volumetric_factor)
+        if weight is None:
+            weight = weights[volumetric_factor] = max(self.weight_kg, self._volume / volumetric_factor)
+        return weight
+
+    @staticmethod
+    def quote_shipping_costs(products, rates) -> list:
+        """Quotes every product against every (rate_per_kg, volumetric_factor) pair, rounded like calculate_shipping_cost. Returns an N x M list of rows. Raises: TypeError, ValueError."""
+        products = list(products)
+        rates = list(rates)
+        for product in products:
+            QUOTED_PRODUCT.check(product)
+        for rate in rates:
+            try:
+                rate_per_kg, volumetric_factor = rate
+            except (TypeError, ValueError):
+                raise TypeError("Rate must be a (rate_per_kg, volumetric_factor) pair.")
+            RATE_PER_KG.check(rate_per_kg)
+            VOLUMETRIC_FACTOR.check(volumetric_factor)
+
+        if numpy is None or not products or not rates:
+            quotes = []
+            for product in products:
+                quotes.append([round(product._chargeable_weight(volumetric_factor) * rate_per_kg, 2)
+                               for rate_per_kg, volumetric_factor in rates])
+            return quotes
+
+        # Same operations in the same order as calculate_shipping_cost, so every unrounded cost is bit-identical.
+        volumes = numpy.array([product._volume for product in products], dtype=numpy.float64)
+        weights = numpy.array([product.weight_kg for product in products], dtype=numpy.float64)
+        rate_columns = numpy.array(rates, dtype=numpy.float64)
+        chargeable = numpy.maximum(weights[:, None], volumes[:, None] / rate_columns[:, 1])
+        costs = chargeable * rate_columns[:, 0]
+
+        # numpy.round scales by 100 before rounding, which can disagree with round() on costs within
+        # an ulp of a half cent or too large to scale exactly; those few are rounded by round() itself.
+        quotes = numpy.round(costs, 2)
+        cents = costs * 100
+        fraction = cents - numpy.floor(cents)
+        unsure = numpy.flatnonzero((numpy.abs(fraction - 0.5) < 1e-6) | ~(numpy.abs(cents) < 2 ** 52))
+        flat_costs = costs.ravel()
+        flat_quotes = quotes.ravel()
+        for index in unsure.tolist():
+            flat_quotes[index] = round(float(flat_costs[index]), 2)
+        return quotes.tolist()
+
     def __repr__(self):
         return f"PhysicalProduct(name='{self.name}', price={self.price}, id='{self.product_id}', weight={self.weight_kg}kg)"
 
 
-class Inventory:
+ChangeEvent = namedtuple("ChangeEvent", ("sequence", "kind", "product_id", "value"))
+
+
+class ChangeFeed:
     """
-    Manages a collection of products.
+    In-process stream of inventory changes, attached with inventory.change_feed = ChangeFeed().
+    Every change is a ChangeEvent with the next sequence number: kind "add" carries the product's
+    details as a read-only dict, "remove" carries None, and "quantity", "price" and "name"
+    carry the new value, so replaying events in order converges on the inventory's state.
+    The newest capacity events are kept.
     """
+    KINDS = ("add", "remove", "quantity", "price", "name")
+
+    def __init__(self, capacity: int = 65536):
+        """Initializes the ChangeFeed. Raises: ValueError."""
+        self.capacity = FEED_CAPACITY.check(capacity)
+        self.sequence = 0
+        self._events = []
+        self._lock = threading.Lock()
+
+    def read(self, after: int = 0, limit: int = 1000) -> list:
+        """Returns up to limit events with sequence numbers greater than after, oldest first. Raises: ValueError."""
+        SEQUENCE_NUMBER.check(after)
+        BATCH_LIMIT.check(limit)
+        with self._lock:
+            first = self.sequence - len(self._events) + 1
+            if after < first - 1:
+                raise ValueError(f"Events after sequence {after} are no longer kept; the oldest kept event is {first}.")
+            start = max(after - first + 1, 0)
+            return self._events[start:start + limit]
+
+    def batches(self, after: int = 0, limit: int = 1000):
+        """Yields lists of up to limit events after a sequence number until the feed is caught up. Raises: ValueError."""
+        while True:
+            batch = self.read(after, limit)
+            if not batch:
+                return
+            yield batch
+            after = batch[-1].sequence
+
+    def _emit(self, kind: str, product_id: str, value) -> None:
+        """Appends an event with the next sequence number, dropping the oldest beyond capacity."""
+        with self._lock:
+            self.sequence += 1
+            self._events.append(ChangeEvent(self.sequence, kind, product_id, value))
+            if len(self._events) >= 2 * self.capacity:
+                del self._events[:len(self._events) - self.capacity]
+
+
+class _ReorderState(threading.local):
+    """Reorder notifications that the current thread has queued but not yet delivered."""
     def __init__(self):
-        """Initializes the Inventory."""
+        self.holds = 0
+        self.pending = deque()
+
+
+class Inventory(metaclass=ABCMeta):
+    """
+    Manages a collection of products. Other stores that support the calls orders make on
+    an inventory register themselves with Inventory.register.
+    """
+    PRODUCT_TYPES = {"GenericProduct": Product, "DigitalProduct": DigitalProduct, "PhysicalProduct": PhysicalProduct}
+    TOP_K_KEYS = ("price", "quantity", "value")
+
+    def __init__(self, exact: bool = False):
+        """Initializes the Inventory. Exact mode keeps the running value as a Decimal."""
         self.products = {}
+        self.exact = exact
+        self._total_value = Decimal(0) if exact else 0.0
+        self._positions = {}
+        self._next_position = 0
+        self._name_index = None
+        self._indexed_names = {}
+        self._price_index = []
+        self._quantity_buckets = {}
+        self._reorder_thresholds = {}
+        self._below_reorder = {}
+        self._reorder_listeners = []
+        self._reorder_state = _ReorderState()
+        self._rank_heaps = {}
+        self.change_feed = None
 
     def add_product(self, product: Product, initial_stock: int = None) -> None:
         """Adds a product to the inventory. Raises: TypeError, ValueError."""
-        if not isinstance(product, Product):
-            raise TypeError("Item to add must be an instance of Product.")
+        PRODUCT_ITEM.check(product)
         if product.product_id in self.products:
             raise ValueError(f"Product with ID {product.product_id} already exists in inventory.")
         
         if initial_stock is not None:
-            if not isinstance(initial_stock, int) or initial_stock < 0:
-                raise ValueError("Initial stock must be a non-negative integer.")
-            product.quantity = initial_stock
-            
+            product.quantity = INITIAL_STOCK.check(initial_stock)
+
+        self._register(product)
+
+    def add_products(self, records) -> dict:
+        """Bulk-loads products from a dict of columns or an iterable of row dicts. Raises: TypeError, ValueError."""
+        invalid, products = self._products_from_records(records)
+        report = {"added": [], "duplicates": [], "invalid": invalid}
+        for row, product in products:
+            if product.product_id in self.products:
+                report["duplicates"].append({"row": row, "product_id": product.product_id})
+                continue
+            self._register(product, bulk=True)
+            report["added"].append(product.product_id)
+        self._price_index.sort()
+        for heap in self._rank_heaps.values():
+            heapq.heapify(heap)
+        return report
+
+    @classmethod
+    def _products_from_records(cls, records) -> tuple:
+        """Validates product records and builds them. Returns (invalid rows, [(row, product)]). Raises: TypeError, ValueError."""
+        columns, size = cls._as_columns(records)
+        errors = {}
+
+        def column(key, default=None):
+            values = columns.get(key)
+            if values is None:
+                return [default] * size
+            return [default if value is None or value == "" else value for value in values]
+
+        def reject(row, message):
+            if message is not None:
+                errors.setdefault(row, message)
+
+        types = column("type", "GenericProduct")
+        names = column("name")
+        prices = [_as_number(value) for value in column("price")]
+        product_ids = column("product_id")
+        quantities = [_as_integer(value) for value in column("quantity")]
+        classes = [cls.PRODUCT_TYPES.get(type_name) for type_name in types]
+
+        for row in range(size):
+            if classes[row] is None:
+                reject(row, f"Unknown product type '{types[row]}'.")
+            reject(row, PRODUCT_NAME.violation(names[row]))
+            reject(row, PRODUCT_PRICE.violation(prices[row]))
+            reject(row, OPTIONAL_PRODUCT_ID.violation(product_ids[row]))
+            if quantities[row] is None:
+                quantities[row] = 1 if classes[row] is DigitalProduct else 0
+            else:
+                reject(row, PRODUCT_QUANTITY.violation(quantities[row]))
+
+        extra_fields = [{} for _ in range(size)]
+        if DigitalProduct in classes:
+            links = column("download_link")
+            sizes = [_as_number(value) for value in column("file_size_mb")]
+            for row in range(size):
+                if classes[row] is not DigitalProduct:
+                    continue
+                reject(row, DOWNLOAD_LINK.violation(links[row]))
+                reject(row, FILE_SIZE.violation(sizes[row]))
+                if row not in errors:
+                    extra_fields[row] = {"download_link": links[row], "file_size_mb": float(sizes[row])}
+        if PhysicalProduct in classes:
+            weights = [_as_number(value) for value in column("weight_kg")]
+            dimensions = [_as_dimensions(value) for value in column("shipping_dimensions_cm")]
+            for row in range(size):
+                if classes[row] is not PhysicalProduct:
+                    continue
+                reject(row, WEIGHT.violation(weights[row]))
+                reject(row, SHIPPING_DIMENSIONS.violation(dimensions[row]))
+                if row not in errors:
+                    extra_fields[row] = {"weight_kg": float(weights[row]), "shipping_dimensions": dimensions[row]}
+
+        invalid = []
+        products = []
+        for row in range(size):
+            if row in errors:
+                invalid.append({"row": row, "error": errors[row]})
+                continue
+            product_id = product_ids[row] or classes[row].id_generator()
+            products.append((row, classes[row]._from_trusted(names[row].strip(), float(prices[row]), product_id,
+                                                             quantities[row], **extra_fields[row])))
+        return invalid, products
+
+    @classmethod
+    def _type_name(cls, product: Product) -> str:
+        """Returns the PRODUCT_TYPES name of a product's class; other subclasses get the name of their nearest listed base."""
+        for product_class in type(product).__mro__:
+            for type_name, product_type in cls.PRODUCT_TYPES.items():
+                if product_type is product_class:
+                    return type_name
+
+    @staticmethod
+    def _as_columns(records) -> tuple:
+        """Normalizes a dict of columns or an iterable of row dicts to (columns, row_count)."""
+        if isinstance(records, dict):
+            columns = {key: list(values) for key, values in records.items()}
+            lengths = {len(values) for values in columns.values()}
+            if len(lengths) > 1:
+                raise ValueError("All product columns must have the same length.")
+            return columns, lengths.pop() if lengths else 0
+        rows = list(records)
+        if not all(isinstance(row, dict) for row in rows):
+            raise TypeError("Product records must be a dict of columns or an iterable of dicts.")
+        keys = dict.fromkeys(key for row in rows for key in row)
+        return {key: [row.get(key) for row in rows] for key in keys}, len(rows)
+
+    def _register(self, product: Product, bulk: bool = False) -> None:
+        """Stores a validated product and adds it to every index. Bulk callers re-sort the price index."""
         self.products[product.product_id] = product
+        self._positions[product.product_id] = self._next_position
+        self._next_position += 1
+        self._index_name(product)
+        if bulk:
+            self._price_index.append((product.price, self._positions[product.product_id], product.product_id))
+        else:
+            self._index_price(product, product.price)
+        self._index_quantity(product.product_id, product.quantity)
+        for (key, largest), heap in self._rank_heaps.items():
+            entry = self._rank_entry(key, largest, product)
+            if bulk:
+                heap.append(entry)
+            else:
+                heapq.heappush(heap, entry)
+        self._total_value += self._value_of(product.price, product.quantity)
+        product._inventories += (self,)
+        if self.change_feed is not None:
+            self.change_feed._emit("add", product.product_id, product.get_details())
 
     def remove_product(self, product_id: str) -> Product:
         """Removes a product from inventory by ID. Raises: TypeError, KeyError."""
-        if not isinstance(product_id, str):
-            raise TypeError("Product ID must be a string.")
-        if product_id not in self.products:
-            raise KeyError(f"Product with ID {product_id} not found in inventory.")
-        return self.products.pop(product_id)
+        product = self._product(PRODUCT_ID.check(product_id))
+        del self.products[product_id]
+        self._unindex_price(product, product.price)
+        self._total_value -= self._value_of(product.price, product.quantity)
+        del self._positions[product_id]
+        self._unindex_name(product_id)
+        self._unindex_quantity(product_id, product.quantity)
+        self._reorder_thresholds.pop(product_id, None)
+        self._below_reorder.pop(product_id, None)
+        product._inventories = tuple(inventory for inventory in product._inventories if inventory is not self)
+        if self.change_feed is not None:
+            self.change_feed._emit("remove", product_id, None)
+        return product
 
     def get_product(self, product_id: str) -> Product:
         """Retrieves a product from inventory by ID. Raises: TypeError, KeyError."""
-        if not isinstance(product_id, str):
-            raise TypeError("Product ID must be a string.")
-        if product_id not in self.products:
+        return self._product(PRODUCT_ID.check(product_id))
+
+    def _product(self, product_id: str) -> Product:
+        """Retrieves a product by an ID already known to be a string. Raises: KeyError."""
+        product = self.products.get(product_id)
+        if product is None:
             raise KeyError(f"Product with ID {product_id} not found in inventory.")
-        return self.products[product_id]
+        return product
 
     def update_stock(self, product_id: str, quantity_change: int) -> None:
         """Updates stock quantity of a product. Raises: TypeError, KeyError, ValueError."""
-        if not isinstance(product_id, str):
-            raise TypeError("Product ID must be a string.")
-        product = self.get_product(product_id)
-        
+        product = self._product(PRODUCT_ID.check(product_id))
+
         try:
             product.update_quantity(quantity_change)
         except ValueError as e:
             raise ValueError(f"Stock update for {product_id} failed: {e}")
 
+    def reserve(self, product_id: str, quantity: int) -> None:
+        """Takes quantity units of a product out of stock. Raises: TypeError, KeyError, ValueError."""
+        POSITIVE_QUANTITY.check(quantity)
+        self._reserve(PRODUCT_ID.check(product_id), quantity)
+
+    def release(self, product_id: str, quantity: int) -> None:
+        """Returns quantity reserved units of a product to stock. Raises: TypeError, KeyError, ValueError."""
+        POSITIVE_QUANTITY.check(quantity)
+        self._release(PRODUCT_ID.check(product_id), quantity)
+
+    def _reserve(self, product_id: str, quantity: int) -> None:
+        """Reserves stock for an already validated product ID and positive quantity. Raises: KeyError, ValueError."""
+        product = self._product(product_id)
+        if product.quantity < quantity:
+            raise ValueError(f"Not enough stock for {product.name} (ID: {product_id}). Requested: {quantity}, Available: {product.quantity}")
+        product.quantity -= quantity
+
+    def _release(self, product_id: str, quantity: int) -> None:
+        """Releases stock for an already validated product ID and positive quantity. Raises: KeyError."""
+        self._product(product_id).quantity += quantity
+
+    def update_stock_many(self, changes) -> list:
+        """Applies (product_id, quantity_change) pairs all-or-nothing. Returns the rejected rows."""
+        products = self.products
+        pending = {}
+        rejected = []
+        for row, change in enumerate(changes):
+            try:
+                product_id, quantity_change = change
+            except (TypeError, ValueError):
+                product_id = quantity_change = None
+                error = "Stock change must be a (product_id, quantity_change) pair."
+            else:
+                error = PRODUCT_ID.violation(product_id) or QUANTITY_CHANGE.violation(quantity_change)
+                if error is None and product_id not in products:
+                    error = f"Product with ID {product_id} not found in inventory."
+                elif error is None:
+                    quantity = pending.get(product_id)
+                    if quantity is None:
+                        quantity = products[product_id].quantity
+                    quantity += quantity_change
+                    if quantity >= 0:
+                        pending[product_id] = quantity
+                        continue
+                    error = f"Stock update for {product_id} failed: Quantity cannot be reduced below zero."
+            rejected.append({
+                "row": row,
+                "product_id": product_id,
+                "quantity_change": quantity_change,
+                "error": error
+            })
+
+        if not rejected:
+            with self._deferred_reorders():
+                for product_id, quantity in pending.items():
+                    products[product_id].quantity = quantity
+        return rejected
+
 
     def get_total_inventory_value(self) -> float:
-        """Calculates the total value of all products in stock."""
-        total_value = sum(p.price * p.quantity for p in self.products.values())
-        return round(total_value, 2)
+        """Returns the total value of all products in stock."""
+        return float(round(self._total_value, 2))
+
+    def verify(self) -> bool:
+        """Checks the running inventory value against a full recomputation, resyncing it on mismatch."""
+        recomputed = sum((self._value_of(p.price, p.quantity) for p in self.products.values()),
+                         Decimal(0) if self.exact else 0.0)
+        if self.exact:
+            consistent = recomputed == self._total_value
+        else:
+            consistent = math.isclose(recomputed, self._total_value, rel_tol=1e-9, abs_tol=1e-6)
+        if not consistent:
+            self._total_value = recomputed
+        return consistent
+
+    def _value_of(self, price: float, quantity: int):
+        """Returns the stock value of a price and quantity; exact mode uses the price's decimal repr."""
+        if self.exact:
+            return Decimal(str(price)) * quantity
+        return price * quantity
 
     def find_products_by_name(self, search_term: str, case_sensitive: bool = False) -> list:
         """Finds products by partial name match. Raises: TypeError."""
-        if not isinstance(search_term, str):
-            raise TypeError("Search term must be a string.")
-        
+        SEARCH_TERM.check(search_term)
+        if not search_term:
+            return list(self.products.values())
+        if not search_term.isascii():
+            return self._scan_products_by_name(search_term, case_sensitive)
+
+        if self._name_index is None:
+            self._name_index = {}
+            for product in self.products.values():
+                self._index_name(product)
+
+        key = search_term.lower()
+        if len(key) <= NAME_INDEX_GRAM_SIZE:
+            candidates = self._name_index.get(key, ())
+        else:
+            postings = sorted(
+                (self._name_index.get(key[i:i + NAME_INDEX_GRAM_SIZE], set())
+                 for i in range(len(key) - NAME_INDEX_GRAM_SIZE + 1)),
+                key=len
+            )
+            candidates = postings[0].intersection(*postings[1:])
+
+        if case_sensitive:
+            matches = [pid for pid in candidates if search_term in self.products[pid].name]
+        else:
+            matches = [pid for pid in candidates if key in self._indexed_names[pid]]
+        matches.sort(key=self._positions.__getitem__)
+        return [self.products[pid] for pid in matches]
+
+    def _scan_products_by_name(self, search_term: str, case_sensitive: bool) -> list:
+        """Finds products by partial name match with a full scan."""
         results = []
         for product in self.products.values():
             p_name = product.name
@@ -202,80 +932,357 @@ class Inventory:
                 results.append(product)
         return results
 
+    def _index_name(self, product: Product) -> None:
+        """Adds a product's lowercased name n-grams to the name index, once it has been built."""
+        name_index = self._name_index
+        if name_index is None:
+            return
+        product_id = product.product_id
+        lowered = product.name.lower()
+        self._indexed_names[product_id] = lowered
+        for gram in _name_grams(lowered):
+            postings = name_index.get(gram)
+            if postings is None:
+                name_index[gram] = {product_id}
+            else:
+                postings.add(product_id)
+
+    def _unindex_name(self, product_id: str) -> None:
+        """Removes a product's name n-grams from the name index."""
+        if self._name_index is None:
+            return
+        for gram in _name_grams(self._indexed_names.pop(product_id)):
+            postings = self._name_index[gram]
+            postings.discard(product_id)
+            if not postings:
+                del self._name_index[gram]
+
+    def _index_price(self, product: Product, price: float) -> None:
+        """Inserts a product into the sorted price index."""
+        bisect.insort(self._price_index, (price, self._positions[product.product_id], product.product_id))
+
+    def _unindex_price(self, product: Product, price: float) -> None:
+        """Removes a product from the sorted price index."""
+        entry = (price, self._positions[product.product_id], product.product_id)
+        del self._price_index[bisect.bisect_left(self._price_index, entry)]
+
+    def _index_quantity(self, product_id: str, quantity: int) -> None:
+        """Adds a product to the bucket of its quantity."""
+        bucket = self._quantity_buckets.get(quantity)
+        if bucket is None:
+            bucket = self._quantity_buckets[quantity] = {}
+        bucket[product_id] = None
+
+    def _unindex_quantity(self, product_id: str, quantity: int) -> None:
+        """Removes a product from the bucket of its quantity, dropping the bucket once it is empty."""
+        bucket = self._quantity_buckets[quantity]
+        del bucket[product_id]
+        if not bucket:
+            del self._quantity_buckets[quantity]
+
+    def _rank_entry(self, key: str, largest: bool, product: Product) -> tuple:
+        """Returns a product's top-k heap entry; heaps of largest values store the negated value."""
+        rank = product.quantity if key == "quantity" else product.price * product.quantity
+        return (-rank if largest else rank, self._positions[product.product_id], product.product_id)
+
+    def _rank_heap(self, key: str, largest: bool) -> list:
+        """Returns the top-k heap for a key and direction, building it on first use."""
+        heap = self._rank_heaps.get((key, largest))
+        if heap is None:
+            heap = self._rank_heaps[(key, largest)] = [
+                self._rank_entry(key, largest, product) for product in self.products.values()
+            ]
+            heapq.heapify(heap)
+        return heap
+
+    def _rerank(self, product: Product, keys: tuple) -> None:
+        """Pushes a changed product's new entries onto the built top-k heaps; its old entries go stale."""
+        for (key, largest), heap in self._rank_heaps.items():
+            if key not in keys:
+                continue
+            heapq.heappush(heap, self._rank_entry(key, largest, product))
+            if len(heap) > 2 * len(self.products) + 64:
+                heap[:] = [entry for entry in heap if self._is_current(key, largest, entry)]
+                heapq.heapify(heap)
+
+    def _is_current(self, key: str, largest: bool, entry: tuple) -> bool:
+        """Tells whether a heap entry still matches its product's value and position."""
+        product = self.products.get(entry[2])
+        return product is not None and self._rank_entry(key, largest, product) == entry
+
+    def _check_reorder(self, product: Product) -> None:
+        """Tracks whether a product is below its reorder threshold and queues a notification when it drops below."""
+        threshold = self._reorder_thresholds.get(product.product_id)
+        if threshold is not None and product.quantity < threshold:
+            if product.product_id not in self._below_reorder:
+                self._below_reorder[product.product_id] = None
+                if self._reorder_listeners:
+                    state = self._reorder_state
+                    state.pending.append((product, threshold))
+                    if not state.holds:
+                        self._notify_reorder()
+        else:
+            self._below_reorder.pop(product.product_id, None)
+
+    @contextlib.contextmanager
+    def _deferred_reorders(self):
+        """Holds back reorder notifications until the outermost deferral on this thread ends, then delivers them."""
+        state = self._reorder_state
+        state.holds += 1
+        try:
+            yield
+        finally:
+            state.holds -= 1
+            if not state.holds and state.pending:
+                self._notify_reorder()
+
+    def _notify_reorder(self) -> None:
+        """Calls the listeners for every queued notification; one that raises is logged and the rest still run."""
+        state = self._reorder_state
+        state.holds += 1
+        try:
+            while state.pending:
+                product, threshold = state.pending.popleft()
+                for listener in list(self._reorder_listeners):
+                    try:
+                        listener(product, threshold)
+                    except Exception:
+                        _logger.exception("Reorder listener %r failed for product %s.", listener, product.product_id)
+        finally:
+            state.holds -= 1
+
+    def _on_product_changed(self, product: Product, field: str, old_value) -> None:
+        """Keeps the secondary indexes in sync with a changed product field."""
+        if field == "name":
+            self._unindex_name(product.product_id)
+            self._index_name(product)
+        elif field == "price":
+            self._unindex_price(product, old_value)
+            self._index_price(product, product.price)
+            self._rerank(product, ("value",))
+            self._total_value += (self._value_of(product.price, product.quantity)
+                                  - self._value_of(old_value, product.quantity))
+        elif field == "quantity":
+            self._total_value += (self._value_of(product.price, product.quantity)
+                                  - self._value_of(product.price, old_value))
+            self._unindex_quantity(product.product_id, old_value)
+            self._index_quantity(product.product_id, product.quantity)
+            self._rerank(product, ("quantity", "value"))
+        if self.change_feed is not None:
+            self.change_feed._emit(field, product.product_id, getattr(product, field))
+        if field == "quantity":
+            self._check_reorder(product)
+
     def get_products_in_price_range(self, min_price: float = 0, max_price: float = float('inf')) -> list:
         """Returns products in price range. Raises: ValueError."""
-        if not isinstance(min_price, (int, float)) or min_price < 0:
-            raise ValueError("Minimum price must be a non-negative number.")
-        if not isinstance(max_price, (int, float)) or max_price < min_price:
-            raise ValueError("Maximum price must be a number greater than or equal to minimum price.")
+        MIN_PRICE.check(min_price)
+        MAX_PRICE.check(max_price, min_price)
 
-        return [p for p in self.products.values() if min_price <= p.price <= max_price]
+        start = bisect.bisect_left(self._price_index, (min_price,))
+        end = bisect.bisect_right(self._price_index, (max_price, float('inf')))
+        matches = sorted(self._price_index[start:end], key=lambda entry: entry[1])
+        return [self.products[pid] for _, _, pid in matches]
 
     def get_stock_level(self, product_id: str) -> int:
         """Gets stock level for a product. Raises: TypeError, KeyError."""
         product = self.get_product(product_id)
         return product.quantity
 
+    def set_reorder_threshold(self, product_id: str, threshold: int = None) -> None:
+        """Sets the stock level below which a product needs reordering; None clears it. Raises: TypeError, KeyError, ValueError."""
+        product = self.get_product(product_id)
+        if threshold is None:
+            self._reorder_thresholds.pop(product_id, None)
+        else:
+            self._reorder_thresholds[product_id] = STOCK_THRESHOLD.check(threshold)
+        self._check_reorder(product)
+
+    def get_reorder_threshold(self, product_id: str) -> int:
+        """Returns a product's reorder threshold, or None if it has none. Raises: TypeError, KeyError."""
+        self.get_product(product_id)
+        return self._reorder_thresholds.get(product_id)
+
+    def get_low_stock_products(self, threshold: int = None) -> list:
+        """Returns products whose quantity is below threshold, or below their own reorder threshold when none is given. Raises: ValueError."""
+        if threshold is None:
+            product_ids = list(self._below_reorder)
+        else:
+            STOCK_THRESHOLD.check(threshold)
+            buckets = self._quantity_buckets
+            if threshold <= len(buckets):
+                quantities = [quantity for quantity in range(threshold) if quantity in buckets]
+            else:
+                quantities = [quantity for quantity in buckets if quantity < threshold]
+            product_ids = [product_id for quantity in quantities for product_id in buckets[quantity]]
+        product_ids.sort(key=self._positions.__getitem__)
+        return [self.products[product_id] for product_id in product_ids]
+
+    def top_k(self, key: str, k: int, largest: bool = True) -> list:
+        """Returns the k products with the largest (or smallest) price, quantity or value, ties in the order they were added. Raises: ValueError."""
+        if key not in self.TOP_K_KEYS:
+            raise ValueError(f"Invalid top-k key '{key}'. Allowed keys are: {', '.join(self.TOP_K_KEYS)}")
+        TOP_K_COUNT.check(k)
+        if key != "price":
+            return self._top_k_from_heap(key, k, largest)
+
+        index = self._price_index
+        if not largest:
+            return [self.products[product_id] for _, _, product_id in index[:k]]
+        # Walk down from the highest price; within a run of equal prices take the earliest-added products first.
+        entries = []
+        end = len(index)
+        while end and len(entries) < k:
+            start = bisect.bisect_left(index, (index[end - 1][0],))
+            entries.extend(index[start:min(end, start + k - len(entries))])
+            end = start
+        return [self.products[product_id] for _, _, product_id in entries]
+
+    def _top_k_from_heap(self, key: str, k: int, largest: bool) -> list:
+        """Pops the k best current entries off a top-k heap, dropping stale ones, and pushes them back."""
+        heap = self._rank_heap(key, largest)
+        taken = []
+        seen = set()
+        while heap and len(taken) < k:
+            entry = heapq.heappop(heap)
+            if entry[2] not in seen and self._is_current(key, largest, entry):
+                taken.append(entry)
+                seen.add(entry[2])
+        for entry in taken:
+            heapq.heappush(heap, entry)
+        return [self.products[product_id] for _, _, product_id in taken]
+
+    def add_reorder_listener(self, listener) -> None:
+        """Registers listener(product, threshold), called once a change is fully applied if it took a product below its reorder threshold; exceptions are logged. Raises: TypeError."""
+        if not callable(listener):
+            raise TypeError("Reorder listener must be callable.")
+        self._reorder_listeners.append(listener)
+
+    def remove_reorder_listener(self, listener) -> None:
+        """Unregisters a reorder listener. Raises: ValueError."""
+        if listener not in self._reorder_listeners:
+            raise ValueError("Reorder listener is not registered.")
+        self._reorder_listeners.remove(listener)
+
+
+def _status_transitions(statuses: list, restricted: dict) -> dict:
+    """Returns the (current status, requested status) -> next status table."""
+    return {
+        (current, requested): requested
+        for current in statuses for requested in statuses
+        if requested in restricted.get(current, statuses)
+    }
+
 
 class Order:
     """
     Represents a customer order.
     """
     ALLOWED_STATUSES = ["pending", "awaiting_payment", "processing", "shipped", "delivered", "cancelled", "refunded"]
+    STATUSES = frozenset(ALLOWED_STATUSES)
+    FINAL_STATUSES = frozenset(["shipped", "delivered", "cancelled", "refunded"])
+    STATUS_TRANSITIONS = _status_transitions(
+        ALLOWED_STATUSES, {"delivered": ("delivered", "refunded"), "cancelled": ("cancelled",)}
+    )
+    id_generator = IdGenerator()
 
     def __init__(self, order_id: str = None, customer_id: str = None):
         """Initializes a new Order. Raises: TypeError."""
-        if order_id is not None and not isinstance(order_id, str):
-            raise TypeError("Order ID must be a string if provided.")
-        if customer_id is not None and not isinstance(customer_id, str):
-            raise TypeError("Customer ID must be a string if provided.")
+        OPTIONAL_ORDER_ID.check(order_id)
+        OPTIONAL_CUSTOMER_ID.check(customer_id)
             
-        self.order_id = order_id if order_id else str(uuid.uuid4())
+        self._books = ()
+        self.order_id = order_id if order_id else type(self).id_generator()
         self.customer_id = customer_id
         self.items = {}
         self.status = "pending"
         self._is_finalized = False
+        self._total = None
+        self._item_count = None
+
+    @property
+    def customer_id(self) -> str:
+        return self._customer_id
+
+    @customer_id.setter
+    def customer_id(self, value: str) -> None:
+        old_value = getattr(self, "_customer_id", None)
+        self._customer_id = value
+        for book in self._books:
+            book._on_order_changed(self, "customer_id", old_value)
+
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, value: str) -> None:
+        old_value = getattr(self, "_status", None)
+        self._status = value
+        for book in self._books:
+            book._on_order_changed(self, "status", old_value)
 
     def add_item(self, product: Product, quantity: int, inventory: Inventory = None) -> None:
         """Adds an item to the order. Raises: RuntimeError, TypeError, ValueError, KeyError."""
-        if self._is_finalized:
-            raise RuntimeError("Cannot add items to a finalized order.")
-        if not isinstance(product, Product):
-            raise TypeError("Item to add must be an instance of Product.")
-        if not isinstance(quantity, int) or quantity <= 0:
-            raise ValueError("Quantity must be a positive integer.")
+        self._check_new_item(product, quantity)
 
         if inventory:
-            if not isinstance(inventory, Inventory):
-                raise TypeError("Inventory must be an Inventory instance.")
-            inv_product = inventory.get_product(product.product_id)
-            if inv_product.quantity < quantity:
-                raise ValueError(f"Not enough stock for {product.name} (ID: {product.product_id}). Requested: {quantity}, Available: {inv_product.quantity}")
-            inventory.update_stock(product.product_id, -quantity)
-
-        product_snapshot = {
-            "product_id": product.product_id,
-            "name": product.name,
-            "type": product.__class__.__name__
-        }
+            INVENTORY.check(inventory)
+            inventory._reserve(product.product_id, quantity)
+
+        self._add_line(product, quantity)
+
+    def add_items(self, lines, inventory: Inventory = None) -> None:
+        """Adds (product, quantity) lines, reserving all stock at once. Raises: RuntimeError, TypeError, ValueError, KeyError."""
+        cart = {}
+        for product, quantity in lines:
+            self._check_new_item(product, quantity)
+            if product.product_id in cart:
+                cart[product.product_id][1] += quantity
+            else:
+                cart[product.product_id] = [product, quantity]
+
+        if inventory:
+            INVENTORY.check(inventory)
+            for product, quantity in cart.values():
+                inv_product = inventory.get_product(product.product_id)
+                if inv_product.quantity < quantity:
+                    raise ValueError(f"Not enough stock for {product.name} (ID: {product.product_id}). Requested: {quantity}, Available: {inv_product.quantity}")
+            rejected = inventory.update_stock_many((product_id, -quantity) for product_id, (_, quantity) in cart.items())
+            if rejected:
+                raise ValueError(rejected[0]["error"])
+
+        for product, quantity in cart.values():
+            self._add_line(product, quantity)
 
+    def _check_new_item(self, product: Product, quantity: int) -> None:
+        """Checks that a product and quantity may be added to the order. Raises: RuntimeError, TypeError, ValueError."""
+        if self._is_finalized:
+            raise RuntimeError("Cannot add items to a finalized order.")
+        PRODUCT_ITEM.check(product)
+        POSITIVE_QUANTITY.check(quantity)
+
+    def _add_line(self, product: Product, quantity: int) -> None:
+        """Adds an already validated and reserved quantity of a product to the order."""
+        self._total = self._item_count = None
         if product.product_id in self.items:
             self.items[product.product_id]["quantity"] += quantity
         else:
             self.items[product.product_id] = {
-                "product_snapshot": product_snapshot, 
+                "product_snapshot": {
+                    "product_id": product.product_id,
+                    "name": product.name,
+                    "type": product.__class__.__name__
+                },
                 "quantity": quantity,
                 "price_at_purchase": product.price
             }
 
     def remove_item(self, product_id: str, quantity_to_remove: int, inventory: Inventory = None) -> None:
         """Removes item quantity from order. Raises: RuntimeError, TypeError, ValueError, KeyError."""
-        if self._is_finalized and self.status not in ["pending", "awaiting_payment"]:
+        if self._is_finalized and self.status not in ("pending", "awaiting_payment"):
              raise RuntimeError(f"Cannot remove items from an order with status '{self.status}'.")
-        if not isinstance(product_id, str):
-            raise TypeError("Product ID must be a string.")
-        if not isinstance(quantity_to_remove, int) or quantity_to_remove <= 0:
-            raise ValueError("Quantity to remove must be a positive integer.")
+        PRODUCT_ID.check(product_id)
+        QUANTITY_TO_REMOVE.check(quantity_to_remove)
         
         if product_id not in self.items:
             raise KeyError(f"Product with ID {product_id} not found in order.")
@@ -284,12 +1291,12 @@ class Order:
             raise ValueError(f"Cannot remove {quantity_to_remove} units of {product_id}; only {self.items[product_id]['quantity']} in order.")
 
         self.items[product_id]["quantity"] -= quantity_to_remove
+        self._total = self._item_count = None
         
         if inventory:
-            if not isinstance(inventory, Inventory):
-                raise TypeError("Inventory must be an Inventory instance.")
+            INVENTORY.check(inventory)
             try:
-                inventory.update_stock(product_id, quantity_to_remove)
+                inventory._release(product_id, quantity_to_remove)
             except KeyError:
                 raise RuntimeError(f"Product {product_id} not found in inventory for restocking. Inconsistent state.")
 
@@ -300,23 +1307,34 @@ class Order:
 
     def calculate_total(self) -> float:
         """Calculates the total cost of the order based on prices at time of purchase."""
-        total_cost = sum(item_data["price_at_purchase"] * item_data["quantity"] for item_data in self.items.values())
-        return round(total_cost, 2)
+        if self._total is None:
+            total_cost = sum(item_data["price_at_purchase"] * item_data["quantity"] for item_data in self.items.values())
+            self._total = round(total_cost, 2)
+        return self._total
+
+    def count_items(self) -> int:
+        """Returns the total number of units in the order."""
+        if self._item_count is None:
+            self._item_count = sum(item["quantity"] for item in self.items.values())
+        return self._item_count
 
     def update_status(self, new_status: str) -> None:
         """Updates the order status. Raises: TypeError, ValueError."""
-        if not isinstance(new_status, str):
-            raise TypeError("New status must be a string.")
-        if new_status.lower() not in self.ALLOWED_STATUSES:
+        NEW_STATUS.check(new_status)
+        requested = new_status.lower()
+        if requested not in self.STATUSES:
             raise ValueError(f"Invalid order status '{new_status}'. Allowed statuses are: {', '.join(self.ALLOWED_STATUSES)}")
-        
-        if self.status == "delivered" and new_status not in ["delivered", "refunded"]:
-            raise ValueError(f"Cannot change status from 'delivered' to '{new_status}'.")
-        if self.status == "cancelled" and new_status != "cancelled":
-            raise ValueError("Cannot change status of a 'cancelled' order.")
-            
-        self.status = new_status.lower()
-        if self.status in ["shipped", "delivered", "cancelled", "refunded"]:
+
+        next_status = self.STATUS_TRANSITIONS.get((self.status, requested))
+        if next_status is None:
+            if self.status == "cancelled":
+                raise ValueError("Cannot change status of a 'cancelled' order.")
+            if self.status in self.STATUSES:
+                raise ValueError(f"Cannot change status from '{self.status}' to '{new_status}'.")
+            next_status = requested
+
+        self.status = next_status
+        if next_status in self.FINAL_STATUSES:
             self._is_finalized = True
 
     def get_order_summary(self) -> dict:
@@ -325,7 +1343,7 @@ class Order:
             "order_id": self.order_id,
             "customer_id": self.customer_id,
             "status": self.status,
-            "total_items": sum(item["quantity"] for item in self.items.values()),
+            "total_items": self.count_items(),
             "total_cost": self.calculate_total(),
             "items": [
                 {
@@ -346,5 +1364,103 @@ class Order:
         if self.status == "pending":
             self.status = "awaiting_payment" 
 
+    def __reduce__(self):
+        """Copies and pickles the order's fields without the order books holding it."""
+        fields = dict(self.__dict__)
+        fields["_books"] = ()
+        return copyreg.__newobj__, (type(self),), fields
+
     def __repr__(self):
-        return f"Order(id='{self.order_id}', status='{self.status}', items={len(self.items)}, total={self.calculate_total()})"
\ No newline at end of file
+        return f"Order(id='{self.order_id}', status='{self.status}', items={len(self.items)}, total={self.calculate_total()})"
+
+
+class OrderBook:
+    """
+    Stores orders with secondary indexes on customer ID and status.
+    """
+    def __init__(self):
+        """Initializes the OrderBook."""
+        self.orders = {}
+        self._by_customer = {}
+        self._by_status = {}
+
+    def add_order(self, order: Order) -> None:
+        """Adds an order to the book. Raises: TypeError, ValueError."""
+        ORDER_ITEM.check(order)
+        if order.order_id in self.orders:
+            raise ValueError(f"Order with ID {order.order_id} already exists in the order book.")
+        self.orders[order.order_id] = order
+        self._by_customer.setdefault(order.customer_id, {})[order.order_id] = order
+        self._by_status.setdefault(order.status, {})[order.order_id] = order
+        order._books += (self,)
+
+    def remove_order(self, order_id: str) -> Order:
+        """Removes an order from the book by ID. Raises: TypeError, KeyError."""
+        order = self.get_order(order_id)
+        del self.orders[order_id]
+        self._unindex(self._by_customer, order.customer_id, order_id)
+        self._unindex(self._by_status, order.status, order_id)
+        order._books = tuple(book for book in order._books if book is not self)
+        return order
+
+    def get_order(self, order_id: str) -> Order:
+        """Retrieves an order by ID. Raises: TypeError, KeyError."""
+        ORDER_ID.check(order_id)
+        if order_id not in self.orders:
+            raise KeyError(f"Order with ID {order_id} not found in the order book.")
+        return self.orders[order_id]
+
+    def get_orders_by_customer(self, customer_id: str) -> list:
+        """Returns a customer's orders in the order they were added. Raises: TypeError."""
+        OPTIONAL_CUSTOMER_ID.check(customer_id)
+        return list(self._by_customer.get(customer_id, {}).values())
+
+    def get_orders_by_status(self, status: str) -> list:
+        """Returns the orders currently in a status, oldest status change first. Raises: TypeError, ValueError."""
+        ORDER_STATUS.check(status)
+        if status.lower() not in Order.STATUSES:
+            raise ValueError(f"Invalid order status '{status}'. Allowed statuses are: {', '.join(Order.ALLOWED_STATUSES)}")
+        return list(self._by_status.get(status.lower(), {}).values())
+
+    def apply_status_events(self, events) -> list:
+        """Applies (order_id, new_status) events in one pass. Returns the rejected events."""
+        orders = self.orders
+        rejected = []
+        for row, event in enumerate(events):
+            try:
+                order_id, new_status = event
+            except (TypeError, ValueError):
+                error = "Status event must be an (order_id, new_status) pair."
+            else:
+                order = orders.get(order_id) if ORDER_ID.violation(order_id) is None else None
+                if order is None:
+                    error = f"Order with ID {order_id} not found in the order book."
+                else:
+                    try:
+                        order.update_status(new_status)
+                        continue
+                    except (TypeError, ValueError) as e:
+                        error = str(e)
+            rejected.append({"row": row, "event": event, "error": error})
+        return rejected
+
+    @staticmethod
+    def _unindex(index: dict, key, order_id: str) -> None:
+        """Removes an order from one bucket of a secondary index."""
+        bucket = index[key]
+        del bucket[order_id]
+        if not bucket:
+            del index[key]
+
+    def _on_order_changed(self, order: Order, field: str, old_value) -> None:
+        """Moves an order between index buckets when an indexed field changes."""
+        index = self._by_status if field == "status" else self._by_customer
+        self._unindex(index, old_value, order.order_id)
+        index.setdefault(getattr(order, field), {})[order.order_id] = order
+
+
+# Rules on instances of the classes above.
+PRODUCT_ITEM = Rule(Product, TypeError, "Item to add must be an instance of Product.")
+QUOTED_PRODUCT = Rule(PhysicalProduct, TypeError, "Products to quote must be instances of PhysicalProduct.")
+INVENTORY = Rule(Inventory, TypeError, "Inventory must be an Inventory instance.")
+ORDER_ITEM = Rule(Order, TypeError, "Item to add must be an instance of Order.")
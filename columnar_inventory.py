@@ -0,0 +1,173 @@
+import math
+import operator
+import weakref
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from code_normal import (Product, PhysicalProduct, Inventory, PRODUCT_ITEM, PRODUCT_ID, QUANTITY_CHANGE,
+                         INITIAL_STOCK, MIN_PRICE, MAX_PRICE, STOCK_THRESHOLD)
+
+
+class ColumnarInventory:
+    """
+    Manages a collection of products as columns of prices, quantities, weights and type codes.
+    Scans run on NumPy views of the columns when NumPy is installed. Only weak references to
+    products are kept, so get_product builds a view of a row when no live product object is
+    left for it; name, price and quantity changes made through a product are written back to
+    the columns.
+    """
+    TYPE_CODES = {"GenericProduct": 0, "DigitalProduct": 1, "PhysicalProduct": 2}
+    TYPE_CLASSES = {code: Inventory.PRODUCT_TYPES[type_name] for type_name, code in TYPE_CODES.items()}
+
+    def __init__(self):
+        """Initializes the ColumnarInventory."""
+        self.rows = {}
+        self._prices = array("d")
+        self._quantities = array("q")
+        self._weights = array("d")
+        self._type_codes = array("b")
+        self._positions = array("q")
+        self._next_position = 0
+        self._product_ids = []
+        self._names = []
+        self._extra_fields = []
+        self._views = weakref.WeakValueDictionary()
+
+    def add_product(self, product: Product, initial_stock: int = None) -> None:
+        """Adds a product to the inventory. Raises: TypeError, ValueError."""
+        PRODUCT_ITEM.check(product)
+        if product.product_id in self.rows:
+            raise ValueError(f"Product with ID {product.product_id} already exists in inventory.")
+
+        if initial_stock is not None:
+            product.quantity = INITIAL_STOCK.check(initial_stock)
+
+        type_name = Inventory._type_name(product)
+        weight_kg = 0.0
+        if type_name == "DigitalProduct":
+            extra_fields = {"download_link": product.download_link, "file_size_mb": product.file_size_mb}
+        elif type_name == "PhysicalProduct":
+            weight_kg = product.weight_kg
+            extra_fields = {"shipping_dimensions": product.shipping_dimensions}
+        else:
+            extra_fields = {}
+
+        self.rows[product.product_id] = len(self._product_ids)
+        self._prices.append(product.price)
+        self._quantities.append(product.quantity)
+        self._weights.append(weight_kg)
+        self._type_codes.append(self.TYPE_CODES[type_name])
+        self._positions.append(self._next_position)
+        self._next_position += 1
+        self._product_ids.append(product.product_id)
+        self._names.append(product.name)
+        self._extra_fields.append(extra_fields)
+        self._views[product.product_id] = product
+        product._inventories += (self,)
+
+    def remove_product(self, product_id: str) -> Product:
+        """Removes a product from inventory by ID. Raises: TypeError, KeyError."""
+        product = self.get_product(product_id)
+        row = self.rows.pop(product_id)
+        last = len(self._product_ids) - 1
+        for column in (self._prices, self._quantities, self._weights, self._type_codes, self._positions,
+                       self._product_ids, self._names, self._extra_fields):
+            column[row] = column[last]
+            column.pop()
+        if row != last:
+            self.rows[self._product_ids[row]] = row
+        del self._views[product_id]
+        product._inventories = tuple(inventory for inventory in product._inventories if inventory is not self)
+        return product
+
+    def get_product(self, product_id: str) -> Product:
+        """Retrieves a product view from inventory by ID, building it on first access. Raises: TypeError, KeyError."""
+        if PRODUCT_ID.check(product_id) not in self.rows:
+            raise KeyError(f"Product with ID {product_id} not found in inventory.")
+        view = self._views.get(product_id)
+        if view is None:
+            view = self._materialize(self.rows[product_id])
+        return view
+
+    def update_stock(self, product_id: str, quantity_change: int) -> None:
+        """Updates stock quantity of a product. Raises: TypeError, KeyError, ValueError."""
+        if PRODUCT_ID.check(product_id) not in self.rows:
+            raise KeyError(f"Product with ID {product_id} not found in inventory.")
+        QUANTITY_CHANGE.check(quantity_change)
+        row = self.rows[product_id]
+        quantity = self._quantities[row] + quantity_change
+        if quantity < 0:
+            raise ValueError(f"Stock update for {product_id} failed: Quantity cannot be reduced below zero.")
+        view = self._views.get(product_id)
+        if view is not None:
+            view.quantity = quantity
+        else:
+            self._quantities[row] = quantity
+
+    def get_total_inventory_value(self) -> float:
+        """Calculates the total value of all products in stock."""
+        if numpy is not None and self._product_ids:
+            prices = numpy.frombuffer(self._prices, dtype=numpy.float64)
+            quantities = numpy.frombuffer(self._quantities, dtype=numpy.int64)
+            return round(float(prices @ quantities), 2)
+        return round(math.fsum(map(operator.mul, self._prices, self._quantities)), 2)
+
+    def get_products_in_price_range(self, min_price: float = 0, max_price: float = float('inf')) -> list:
+        """Returns products in price range. Raises: ValueError."""
+        MIN_PRICE.check(min_price)
+        MAX_PRICE.check(max_price, min_price)
+
+        if numpy is not None and self._product_ids:
+            prices = numpy.frombuffer(self._prices, dtype=numpy.float64)
+            rows = numpy.flatnonzero((prices >= min_price) & (prices <= max_price)).tolist()
+        else:
+            rows = [row for row, price in enumerate(self._prices) if min_price <= price <= max_price]
+        return self._products_at(rows)
+
+    def get_low_stock_products(self, threshold: int) -> list:
+        """Returns products whose quantity is below threshold. Raises: ValueError."""
+        STOCK_THRESHOLD.check(threshold)
+
+        if numpy is not None and self._product_ids:
+            quantities = numpy.frombuffer(self._quantities, dtype=numpy.int64)
+            rows = numpy.flatnonzero(quantities < threshold).tolist()
+        else:
+            rows = [row for row, quantity in enumerate(self._quantities) if quantity < threshold]
+        return self._products_at(rows)
+
+    def get_stock_level(self, product_id: str) -> int:
+        """Gets stock level for a product. Raises: TypeError, KeyError."""
+        if PRODUCT_ID.check(product_id) not in self.rows:
+            raise KeyError(f"Product with ID {product_id} not found in inventory.")
+        return self._quantities[self.rows[product_id]]
+
+    def _products_at(self, rows: list) -> list:
+        """Returns the product views for rows, in the order the products were added."""
+        rows.sort(key=self._positions.__getitem__)
+        return [self.get_product(self._product_ids[row]) for row in rows]
+
+    def _materialize(self, row: int) -> Product:
+        """Builds and caches a product view whose changes are written back to the columns."""
+        cls = self.TYPE_CLASSES[self._type_codes[row]]
+        extra_fields = dict(self._extra_fields[row])
+        if cls is PhysicalProduct:
+            extra_fields["weight_kg"] = self._weights[row]
+        view = cls._from_trusted(self._names[row], self._prices[row], self._product_ids[row],
+                                 self._quantities[row], **extra_fields)
+        view._inventories = (self,)
+        self._views[view.product_id] = view
+        return view
+
+    def _on_product_changed(self, product: Product, field: str, old_value) -> None:
+        """Writes a change made through a product view back to the columns."""
+        row = self.rows[product.product_id]
+        if field == "name":
+            self._names[row] = product.name
+        elif field == "price":
+            self._prices[row] = product.price
+        elif field == "quantity":
+            self._quantities[row] = product.quantity
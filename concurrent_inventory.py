@@ -0,0 +1,114 @@
+import threading
+
+from code_normal import Product, Inventory, Rule, PRODUCT_ID
+
+STRIPE_COUNT = Rule(int, ValueError, "Stripe count must be a positive integer.", lambda count: count <= 0)
+
+
+class ConcurrentInventory(Inventory):
+    """
+    Inventory that can be shared between threads. Per-product work is serialized by a
+    striped lock chosen from the product ID, so threads working on different products
+    rarely wait for each other; adding and removing products and index maintenance go
+    through a separate lock, always taken after a stripe. Stock must be changed through the
+    inventory, not through Product.update_quantity, to be covered by the locks. Reorder
+    listeners run once the call that made the change has released its locks, so they may
+    change the stock of any product.
+    """
+    def __init__(self, exact: bool = False, stripes: int = 64):
+        """Initializes the ConcurrentInventory. Raises: ValueError."""
+        STRIPE_COUNT.check(stripes)
+        super().__init__(exact)
+        self._stripes = [threading.RLock() for _ in range(stripes)]
+        self._index_lock = threading.RLock()
+
+    def add_product(self, product: Product, initial_stock: int = None) -> None:
+        """Adds a product to the inventory. Raises: TypeError, ValueError."""
+        with self._index_lock:
+            super().add_product(product, initial_stock)
+
+    def add_products(self, records) -> dict:
+        """Bulk-loads products from a dict of columns or an iterable of row dicts. Raises: TypeError, ValueError."""
+        with self._index_lock:
+            return super().add_products(records)
+
+    def remove_product(self, product_id: str) -> Product:
+        """Removes a product from inventory by ID. Raises: TypeError, KeyError."""
+        with self._stripe_for(product_id), self._index_lock:
+            return super().remove_product(product_id)
+
+    def update_stock(self, product_id: str, quantity_change: int) -> None:
+        """Updates stock quantity of a product. Raises: TypeError, KeyError, ValueError."""
+        with self._deferred_reorders(), self._stripe_for(product_id):
+            super().update_stock(product_id, quantity_change)
+
+    def _reserve(self, product_id: str, quantity: int) -> None:
+        """Atomically takes quantity units of a product out of stock. Raises: KeyError, ValueError."""
+        with self._deferred_reorders(), self._stripes[self._stripe_number(product_id)]:
+            super()._reserve(product_id, quantity)
+
+    def _release(self, product_id: str, quantity: int) -> None:
+        """Atomically returns quantity reserved units of a product to stock. Raises: KeyError."""
+        with self._deferred_reorders(), self._stripes[self._stripe_number(product_id)]:
+            super()._release(product_id, quantity)
+
+    def update_stock_many(self, changes) -> list:
+        """Applies (product_id, quantity_change) pairs all-or-nothing while holding every affected stripe. Returns the rejected rows."""
+        pairs = []
+        product_ids = set()
+        for change in changes:
+            try:
+                product_id, quantity_change = change
+            except (TypeError, ValueError):
+                pairs.append(change)
+                continue
+            pairs.append((product_id, quantity_change))
+            if PRODUCT_ID.violation(product_id) is None:
+                product_ids.add(product_id)
+        stripe_numbers = sorted({self._stripe_number(product_id) for product_id in product_ids})
+        with self._deferred_reorders():
+            for number in stripe_numbers:
+                self._stripes[number].acquire()
+            try:
+                return super().update_stock_many(pairs)
+            finally:
+                for number in reversed(stripe_numbers):
+                    self._stripes[number].release()
+
+    def find_products_by_name(self, search_term: str, case_sensitive: bool = False) -> list:
+        """Finds products by partial name match. Raises: TypeError."""
+        with self._index_lock:
+            return super().find_products_by_name(search_term, case_sensitive)
+
+    def get_products_in_price_range(self, min_price: float = 0, max_price: float = float('inf')) -> list:
+        """Returns products in price range. Raises: ValueError."""
+        with self._index_lock:
+            return super().get_products_in_price_range(min_price, max_price)
+
+    def set_reorder_threshold(self, product_id: str, threshold: int = None) -> None:
+        """Sets the stock level below which a product needs reordering; None clears it. Raises: TypeError, KeyError, ValueError."""
+        with self._deferred_reorders(), self._stripe_for(product_id), self._index_lock:
+            super().set_reorder_threshold(product_id, threshold)
+
+    def get_low_stock_products(self, threshold: int = None) -> list:
+        """Returns products whose quantity is below threshold, or below their own reorder threshold when none is given. Raises: ValueError."""
+        with self._index_lock:
+            return super().get_low_stock_products(threshold)
+
+    def top_k(self, key: str, k: int, largest: bool = True) -> list:
+        """Returns the k products with the largest (or smallest) price, quantity or value, ties in the order they were added. Raises: ValueError."""
+        with self._index_lock:
+            return super().top_k(key, k, largest)
+
+    def _stripe_number(self, product_id: str) -> int:
+        """Returns the index of the lock guarding a product ID."""
+        return hash(product_id) % len(self._stripes)
+
+    def _stripe_for(self, product_id: str) -> threading.RLock:
+        """Returns the lock guarding a product ID. Raises: TypeError."""
+        return self._stripes[self._stripe_number(PRODUCT_ID.check(product_id))]
+
+    def _on_product_changed(self, product: Product, field: str, old_value) -> None:
+        """Keeps the shared indexes in sync with a changed product field under the index lock."""
+        with self._index_lock:
+            super()._on_product_changed(product, field, old_value)
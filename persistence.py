@@ -0,0 +1,612 @@
+import mmap
+import os
+import struct
+import zlib
+
+from code_normal import (Product, DigitalProduct, PhysicalProduct, Inventory, Rule, PRODUCT_ITEM, PRODUCT_ID,
+                         INITIAL_STOCK, MIN_PRICE, MAX_PRICE)
+
+RECORD_HEADER = struct.Struct("<BI")
+RECORD_CHECKSUM = struct.Struct("<I")
+STRING_LENGTH = struct.Struct("<I")
+PRODUCT_FIELDS = struct.Struct("<Bdq")
+DIGITAL_FIELDS = struct.Struct("<d")
+PHYSICAL_FIELDS = struct.Struct("<dddd")
+QUANTITY_FIELDS = struct.Struct("<q")
+PRICE_FIELDS = struct.Struct("<d")
+BATCH_LENGTH = struct.Struct("<I")
+
+SNAPSHOT_MAGIC = b"INVSNAP1"
+SNAPSHOT_HEADER = struct.Struct("<8sQQdQQQ")
+SNAPSHOT_RECORD = struct.Struct("<BdqdddddQIQIQI")
+SNAPSHOT_PRICE = struct.Struct("<d")
+ROW_INDEX = struct.Struct("<I")
+
+OP_ADD = 1
+OP_REMOVE = 2
+OP_QUANTITY = 3
+OP_PRICE = 4
+OP_NAME = 5
+OP_STOCK_BATCH = 6
+
+FSYNC_BATCH = Rule(int, ValueError, "Fsync batch size must be a positive integer.", lambda size: size <= 0)
+
+TYPE_CODES = {"GenericProduct": 0, "DigitalProduct": 1, "PhysicalProduct": 2}
+TYPE_CLASSES = {code: Inventory.PRODUCT_TYPES[type_name] for type_name, code in TYPE_CODES.items()}
+
+
+def _pack_string(value: str) -> bytes:
+    """Encodes a string as a length-prefixed UTF-8 byte string."""
+    data = value.encode("utf-8")
+    return STRING_LENGTH.pack(len(data)) + data
+
+
+def _unpack_string(buffer, offset: int) -> tuple:
+    """Decodes a length-prefixed UTF-8 string. Returns (value, next_offset)."""
+    (length,) = STRING_LENGTH.unpack_from(buffer, offset)
+    offset += STRING_LENGTH.size
+    return bytes(buffer[offset:offset + length]).decode("utf-8"), offset + length
+
+
+def encode_product(product: Product) -> bytes:
+    """Encodes every field of a product for a log record."""
+    type_name = Inventory._type_name(product)
+    parts = [
+        PRODUCT_FIELDS.pack(TYPE_CODES[type_name], product.price, product.quantity),
+        _pack_string(product.product_id),
+        _pack_string(product.name),
+    ]
+    if type_name == "DigitalProduct":
+        parts.append(DIGITAL_FIELDS.pack(product.file_size_mb))
+        parts.append(_pack_string(product.download_link))
+    elif type_name == "PhysicalProduct":
+        parts.append(PHYSICAL_FIELDS.pack(product.weight_kg, *product.shipping_dimensions))
+    return b"".join(parts)
+
+
+def decode_product(buffer, offset: int = 0) -> Product:
+    """Rebuilds a product from the bytes written by encode_product."""
+    type_code, price, quantity = PRODUCT_FIELDS.unpack_from(buffer, offset)
+    offset += PRODUCT_FIELDS.size
+    product_id, offset = _unpack_string(buffer, offset)
+    name, offset = _unpack_string(buffer, offset)
+    cls = TYPE_CLASSES[type_code]
+    fields = {}
+    if cls is DigitalProduct:
+        (fields["file_size_mb"],) = DIGITAL_FIELDS.unpack_from(buffer, offset)
+        fields["download_link"], offset = _unpack_string(buffer, offset + DIGITAL_FIELDS.size)
+    elif cls is PhysicalProduct:
+        weight_kg, *dimensions = PHYSICAL_FIELDS.unpack_from(buffer, offset)
+        fields = {"weight_kg": weight_kg, "shipping_dimensions": tuple(dimensions)}
+    return cls._from_trusted(name, price, product_id, quantity, **fields)
+
+
+def encode_change(product: Product, field: str) -> tuple:
+    """Returns the (op, payload) log record storing a product field's new value."""
+    key = _pack_string(product.product_id)
+    if field == "quantity":
+        return OP_QUANTITY, key + QUANTITY_FIELDS.pack(product.quantity)
+    if field == "price":
+        return OP_PRICE, key + PRICE_FIELDS.pack(product.price)
+    return OP_NAME, key + _pack_string(product.name)
+
+
+def encode_stock_batch(changes: list) -> bytes:
+    """Encodes (product_id, quantity) pairs as the payload of one stock batch record."""
+    parts = [BATCH_LENGTH.pack(len(changes))]
+    for product_id, quantity in changes:
+        parts.append(_pack_string(product_id))
+        parts.append(QUANTITY_FIELDS.pack(quantity))
+    return b"".join(parts)
+
+
+def decode_stock_batch(payload: bytes) -> list:
+    """Returns the (product_id, quantity) pairs stored by encode_stock_batch."""
+    (count,) = BATCH_LENGTH.unpack_from(payload, 0)
+    offset = BATCH_LENGTH.size
+    changes = []
+    for _ in range(count):
+        product_id, offset = _unpack_string(payload, offset)
+        (quantity,) = QUANTITY_FIELDS.unpack_from(payload, offset)
+        offset += QUANTITY_FIELDS.size
+        changes.append((product_id, quantity))
+    return changes
+
+
+def apply_change(product: Product, op: int, payload: bytes, offset: int) -> None:
+    """Sets the product field stored in a change record whose value starts at offset."""
+    if op == OP_QUANTITY:
+        (product.quantity,) = QUANTITY_FIELDS.unpack_from(payload, offset)
+    elif op == OP_PRICE:
+        (product.price,) = PRICE_FIELDS.unpack_from(payload, offset)
+    elif op == OP_NAME:
+        product.name, _ = _unpack_string(payload, offset)
+
+
+def _fsync_directory(path: str) -> None:
+    """Makes a rename inside the directory of path durable, where the platform allows opening directories."""
+    try:
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory)
+    except OSError:
+        pass
+    finally:
+        os.close(directory)
+
+
+def write_snapshot(path: str, products, log_offset: int = 0) -> None:
+    """Writes products to a snapshot file: fixed-width records, id and price orders, then a string heap.
+    The file is written and fsynced under a temporary name, then renamed over path."""
+    records = []
+    heap = bytearray()
+    prices = []
+    total_value = 0.0
+
+    def heap_string(value: str) -> tuple:
+        data = value.encode("utf-8")
+        heap.extend(data)
+        return len(heap) - len(data), len(data)
+
+    for product in products:
+        type_name = Inventory._type_name(product)
+        digital = type_name == "DigitalProduct"
+        physical = type_name == "PhysicalProduct"
+        link = heap_string(product.download_link) if digital else (0, 0)
+        dimensions = product.shipping_dimensions if physical else (0.0, 0.0, 0.0)
+        records.append(SNAPSHOT_RECORD.pack(
+            TYPE_CODES[type_name], product.price, product.quantity,
+            product.weight_kg if physical else 0.0, *dimensions,
+            product.file_size_mb if digital else 0.0,
+            *heap_string(product.product_id), *heap_string(product.name), *link
+        ))
+        prices.append(product.price)
+        total_value += product.price * product.quantity
+
+    count = len(records)
+    id_keys = [bytes(heap[offset:offset + length]) for offset, length in
+               (SNAPSHOT_RECORD.unpack(record)[8:10] for record in records)]
+    id_order = sorted(range(count), key=id_keys.__getitem__)
+    price_order = sorted(range(count), key=lambda row: (prices[row], row))
+
+    records_offset = SNAPSHOT_HEADER.size
+    id_order_offset = records_offset + count * SNAPSHOT_RECORD.size
+    price_order_offset = id_order_offset + count * ROW_INDEX.size
+    heap_offset = price_order_offset + count * ROW_INDEX.size
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as snapshot_file:
+            snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, count, log_offset, total_value,
+                                                     id_order_offset, price_order_offset, heap_offset))
+            snapshot_file.write(b"".join(records))
+            snapshot_file.write(b"".join(ROW_INDEX.pack(row) for row in id_order))
+            snapshot_file.write(b"".join(ROW_INDEX.pack(row) for row in price_order))
+            snapshot_file.write(heap)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    _fsync_directory(path)
+
+
+class SnapshotFile:
+    """
+    Read-only, memory-mapped view of a snapshot written by write_snapshot.
+    """
+    def __init__(self, path: str):
+        """Maps the snapshot file. Raises: ValueError."""
+        self.path = path
+        with open(path, "rb") as snapshot_file:
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self._count, self.log_offset, self.total_value, self._id_order_offset,
+         self._price_order_offset, self._heap_offset) = SNAPSHOT_HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not an inventory snapshot.")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def find(self, product_id: str) -> int:
+        """Returns the row of a product ID by binary search over the id order, or -1."""
+        key = product_id.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            row = self._row_in_order(self._id_order_offset, middle)
+            candidate = self._id_bytes(row)
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return row
+        return -1
+
+    def product_id_at(self, row: int) -> str:
+        return self._id_bytes(row).decode("utf-8")
+
+    def quantity_at(self, row: int) -> int:
+        return self._record(row)[2]
+
+    def product_at(self, row: int) -> Product:
+        """Builds a Product from a snapshot row."""
+        (type_code, price, quantity, weight_kg, length, width, height, file_size_mb,
+         id_offset, id_length, name_offset, name_length, link_offset, link_length) = self._record(row)
+        cls = TYPE_CLASSES[type_code]
+        fields = {}
+        if cls is DigitalProduct:
+            fields = {"download_link": self._heap_string(link_offset, link_length), "file_size_mb": file_size_mb}
+        elif cls is PhysicalProduct:
+            fields = {"weight_kg": weight_kg, "shipping_dimensions": (length, width, height)}
+        return cls._from_trusted(self._heap_string(name_offset, name_length), price,
+                                 self._heap_string(id_offset, id_length), quantity, **fields)
+
+    def rows_in_price_range(self, min_price: float, max_price: float) -> list:
+        """Returns the rows whose snapshot price lies in [min_price, max_price], found by bisecting the price order."""
+        def price_at_rank(rank):
+            return SNAPSHOT_PRICE.unpack_from(
+                self._map, SNAPSHOT_HEADER.size + self._row_in_order(self._price_order_offset, rank) * SNAPSHOT_RECORD.size + 1)[0]
+
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if price_at_rank(middle) < min_price:
+                low = middle + 1
+            else:
+                high = middle
+        rows = []
+        for rank in range(low, self._count):
+            if price_at_rank(rank) > max_price:
+                break
+            rows.append(self._row_in_order(self._price_order_offset, rank))
+        return rows
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _record(self, row: int) -> tuple:
+        return SNAPSHOT_RECORD.unpack_from(self._map, SNAPSHOT_HEADER.size + row * SNAPSHOT_RECORD.size)
+
+    def _row_in_order(self, order_offset: int, rank: int) -> int:
+        return ROW_INDEX.unpack_from(self._map, order_offset + rank * ROW_INDEX.size)[0]
+
+    def _id_bytes(self, row: int) -> bytes:
+        id_offset, id_length = self._record(row)[8:10]
+        start = self._heap_offset + id_offset
+        return self._map[start:start + id_length]
+
+    def _heap_string(self, offset: int, length: int) -> str:
+        start = self._heap_offset + offset
+        return self._map[start:start + length].decode("utf-8")
+
+
+class WriteAheadLog:
+    """
+    Append-only binary log of inventory mutations. Records are written to the file straight
+    away, so they survive the process dying, but only fsynced once every fsync_batch records
+    (group commit) or on commit()/close().
+    """
+    def __init__(self, path: str, fsync_batch: int = 64):
+        """Opens the log for appending, creating it if needed. Raises: ValueError."""
+        self.path = path
+        self.fsync_batch = FSYNC_BATCH.check(fsync_batch)
+        self._unsynced = 0
+        self._file = open(path, "ab")
+
+    def append(self, op: int, payload: bytes) -> None:
+        """Appends one record and hands it to the operating system, committing when the fsync batch is full."""
+        self._file.write(RECORD_HEADER.pack(op, len(payload)) + payload
+                         + RECORD_CHECKSUM.pack(zlib.crc32(payload, op)))
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_batch:
+            self.commit()
+
+    def commit(self) -> None:
+        """Flushes and fsyncs every record appended so far."""
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def offset(self) -> int:
+        """Returns the byte offset just past the last appended record."""
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self) -> None:
+        """Commits outstanding records and closes the log."""
+        if not self._file.closed:
+            self.commit()
+            self._file.close()
+
+    @staticmethod
+    def read(path: str, offset: int = 0):
+        """Yields (op, payload) for each intact record from offset, truncating a torn tail."""
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as log_file:
+            data = log_file.read()
+        end = len(data)
+        while offset < end:
+            if offset + RECORD_HEADER.size > end:
+                break
+            op, length = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            stop = start + length
+            if stop + RECORD_CHECKSUM.size > end:
+                break
+            payload = data[start:stop]
+            (checksum,) = RECORD_CHECKSUM.unpack_from(data, stop)
+            if checksum != zlib.crc32(payload, op):
+                break
+            yield op, payload
+            offset = stop + RECORD_CHECKSUM.size
+        if offset < end:
+            with open(path, "r+b") as log_file:
+                log_file.truncate(offset)
+
+
+class PersistentInventory(Inventory):
+    """
+    Inventory whose mutations are recorded in a WriteAheadLog and replayed on startup.
+    Stock, price and name changes are logged as the resulting value, so changes made
+    through Product methods or orders are captured as well as update_stock calls.
+    An update_stock_many batch is logged as one record, so it is replayed whole or not at all.
+    """
+    def __init__(self, path: str, fsync_batch: int = 64, exact: bool = False):
+        """Replays the log at path, then opens it for appending. Raises: ValueError."""
+        super().__init__(exact)
+        self._stock_batch = None
+        self._replaying = True
+        for op, payload in WriteAheadLog.read(path):
+            self._apply_record(op, payload)
+        self._replaying = False
+        self.log = WriteAheadLog(path, fsync_batch)
+
+    def commit(self) -> None:
+        """Forces every logged mutation to disk."""
+        self.log.commit()
+
+    def close(self) -> None:
+        """Commits and closes the log."""
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def remove_product(self, product_id: str) -> Product:
+        """Removes a product from inventory by ID. Raises: TypeError, KeyError."""
+        product = super().remove_product(product_id)
+        if not self._replaying:
+            self.log.append(OP_REMOVE, product_id.encode("utf-8"))
+        return product
+
+    def _register(self, product: Product, bulk: bool = False) -> None:
+        """Stores a validated product and logs its addition."""
+        super()._register(product, bulk)
+        if not self._replaying:
+            self.log.append(OP_ADD, encode_product(product))
+
+    def update_stock_many(self, changes) -> list:
+        """Applies (product_id, quantity_change) pairs all-or-nothing and logs them as one record. Returns the rejected rows."""
+        with self._deferred_reorders():
+            self._stock_batch = []
+            try:
+                rejected = super().update_stock_many(changes)
+            finally:
+                batch, self._stock_batch = self._stock_batch, None
+            if batch:
+                self.log.append(OP_STOCK_BATCH, encode_stock_batch(batch))
+        return rejected
+
+    def snapshot(self, path: str) -> None:
+        """Commits the log and writes a snapshot that resumes replay after the current log end."""
+        self.commit()
+        write_snapshot(path, self.products.values(), self.log.offset())
+
+    def _on_product_changed(self, product: Product, field: str, old_value) -> None:
+        """Logs the new field value, then keeps the indexes in sync and notifies reorder listeners.
+        The field has already changed, so the indexes follow it even when the log append raises."""
+        try:
+            if not self._replaying:
+                if self._stock_batch is not None and field == "quantity":
+                    self._stock_batch.append((product.product_id, product.quantity))
+                else:
+                    self.log.append(*encode_change(product, field))
+        finally:
+            super()._on_product_changed(product, field, old_value)
+
+    def _apply_record(self, op: int, payload: bytes) -> None:
+        """Applies one replayed log record to the in-memory inventory."""
+        if op == OP_ADD:
+            self._register(decode_product(payload))
+        elif op == OP_REMOVE:
+            self.remove_product(payload.decode("utf-8"))
+        elif op == OP_STOCK_BATCH:
+            for product_id, quantity in decode_stock_batch(payload):
+                self.products[product_id].quantity = quantity
+        else:
+            product_id, offset = _unpack_string(payload, 0)
+            apply_change(self.products[product_id], op, payload, offset)
+
+
+class MappedInventory:
+    """
+    Inventory started from a memory-mapped snapshot. Products stay in the snapshot until
+    get_product materializes them; mutations are kept in memory on top of the snapshot and
+    appended to the write-ahead log, which is replayed from the snapshot's log offset.
+    """
+    def __init__(self, snapshot_path: str, log_path: str, fsync_batch: int = 64):
+        """Maps the snapshot and replays the log written after it. Raises: ValueError."""
+        self.snapshot_file = SnapshotFile(snapshot_path)
+        self._loaded = {}
+        self._added_positions = {}
+        self._next_position = len(self.snapshot_file)
+        self._removed = set()
+        self._value_change = 0.0
+        self._replaying = True
+        for op, payload in WriteAheadLog.read(log_path, self.snapshot_file.log_offset):
+            self._apply_record(op, payload)
+        self._replaying = False
+        self.log = WriteAheadLog(log_path, fsync_batch)
+
+    def add_product(self, product: Product, initial_stock: int = None) -> None:
+        """Adds a product to the inventory. Raises: TypeError, ValueError."""
+        PRODUCT_ITEM.check(product)
+        if self._contains(product.product_id):
+            raise ValueError(f"Product with ID {product.product_id} already exists in inventory.")
+        if initial_stock is not None:
+            product.quantity = INITIAL_STOCK.check(initial_stock)
+
+        self._loaded[product.product_id] = product
+        self._added_positions[product.product_id] = self._next_position
+        self._next_position += 1
+        self._value_change += product.price * product.quantity
+        product._inventories += (self,)
+        if not self._replaying:
+            self.log.append(OP_ADD, encode_product(product))
+
+    def remove_product(self, product_id: str) -> Product:
+        """Removes a product from inventory by ID. Raises: TypeError, KeyError."""
+        product = self.get_product(product_id)
+        del self._loaded[product_id]
+        if self._added_positions.pop(product_id, None) is None:
+            self._removed.add(product_id)
+        self._value_change -= product.price * product.quantity
+        product._inventories = tuple(inventory for inventory in product._inventories if inventory is not self)
+        if not self._replaying:
+            self.log.append(OP_REMOVE, product_id.encode("utf-8"))
+        return product
+
+    def get_product(self, product_id: str) -> Product:
+        """Retrieves a product by ID, materializing it from the snapshot on first access. Raises: TypeError, KeyError."""
+        PRODUCT_ID.check(product_id)
+        product = self._loaded.get(product_id)
+        if product is not None:
+            return product
+        row = -1 if product_id in self._removed else self.snapshot_file.find(product_id)
+        if row < 0:
+            raise KeyError(f"Product with ID {product_id} not found in inventory.")
+        product = self.snapshot_file.product_at(row)
+        product._inventories = (self,)
+        self._loaded[product_id] = product
+        return product
+
+    def update_stock(self, product_id: str, quantity_change: int) -> None:
+        """Updates stock quantity of a product. Raises: TypeError, KeyError, ValueError."""
+        product = self.get_product(product_id)
+        try:
+            product.update_quantity(quantity_change)
+        except ValueError as e:
+            raise ValueError(f"Stock update for {product_id} failed: {e}")
+
+    def get_stock_level(self, product_id: str) -> int:
+        """Gets stock level for a product. Raises: TypeError, KeyError."""
+        product = self._loaded.get(product_id)
+        if product is not None:
+            return product.quantity
+        PRODUCT_ID.check(product_id)
+        row = -1 if product_id in self._removed else self.snapshot_file.find(product_id)
+        if row < 0:
+            raise KeyError(f"Product with ID {product_id} not found in inventory.")
+        return self.snapshot_file.quantity_at(row)
+
+    def get_total_inventory_value(self) -> float:
+        """Returns the total value of all products in stock."""
+        return round(self.snapshot_file.total_value + self._value_change, 2)
+
+    def get_products_in_price_range(self, min_price: float = 0, max_price: float = float('inf')) -> list:
+        """Returns products in price range. Raises: ValueError."""
+        MIN_PRICE.check(min_price)
+        MAX_PRICE.check(max_price, min_price)
+
+        matches = []
+        for row in self.snapshot_file.rows_in_price_range(min_price, max_price):
+            product_id = self.snapshot_file.product_id_at(row)
+            if product_id not in self._loaded and product_id not in self._removed:
+                matches.append((row, product_id))
+        for product_id, product in self._loaded.items():
+            if min_price <= product.price <= max_price:
+                matches.append((self._position(product_id), product_id))
+        matches.sort()
+        return [self.get_product(product_id) for _, product_id in matches]
+
+    def snapshot(self, path: str) -> None:
+        """Commits the log and writes a snapshot of the current state, materializing every product.
+        Writing over the mapped snapshot switches the inventory to the new file."""
+        self.commit()
+        remap = os.path.exists(path) and os.path.samefile(path, self.snapshot_file.path)
+        product_ids = [self.snapshot_file.product_id_at(row) for row in range(len(self.snapshot_file))]
+        product_ids = [product_id for product_id in product_ids if product_id not in self._removed]
+        product_ids.extend(self._added_positions)
+        write_snapshot(path, (self.get_product(product_id) for product_id in product_ids), self.log.offset())
+        if remap:
+            self._remap(path)
+
+    def commit(self) -> None:
+        """Forces every logged mutation to disk."""
+        self.log.commit()
+
+    def close(self) -> None:
+        """Commits and closes the log and unmaps the snapshot."""
+        self.log.close()
+        self.snapshot_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _remap(self, path: str) -> None:
+        """Maps a snapshot of the current state in place of the old one, which already holds every in-memory change."""
+        snapshot_file = SnapshotFile(path)
+        self.snapshot_file.close()
+        self.snapshot_file = snapshot_file
+        self._added_positions.clear()
+        self._next_position = len(snapshot_file)
+        self._removed.clear()
+        self._value_change = 0.0
+
+    def _contains(self, product_id: str) -> bool:
+        """Returns whether a product ID is present, without materializing it."""
+        if product_id in self._loaded:
+            return True
+        return product_id not in self._removed and self.snapshot_file.find(product_id) >= 0
+
+    def _position(self, product_id: str) -> int:
+        """Returns a product's insertion position: its snapshot row, or a position after every row."""
+        position = self._added_positions.get(product_id)
+        return self.snapshot_file.find(product_id) if position is None else position
+
+    def _on_product_changed(self, product: Product, field: str, old_value) -> None:
+        """Tracks the inventory value change and logs the new field value."""
+        if field == "quantity":
+            self._value_change += product.price * (product.quantity - old_value)
+        elif field == "price":
+            self._value_change += (product.price - old_value) * product.quantity
+        if not self._replaying:
+            self.log.append(*encode_change(product, field))
+
+    def _apply_record(self, op: int, payload: bytes) -> None:
+        """Applies one replayed log record on top of the snapshot."""
+        if op == OP_ADD:
+            self.add_product(decode_product(payload))
+        elif op == OP_REMOVE:
+            self.remove_product(payload.decode("utf-8"))
+        elif op == OP_STOCK_BATCH:
+            for product_id, quantity in decode_stock_batch(payload):
+                self.get_product(product_id).quantity = quantity
+        else:
+            product_id, offset = _unpack_string(payload, 0)
+            apply_change(self.get_product(product_id), op, payload, offset)
@@ -0,0 +1,91 @@
+import json
+import math
+from json.encoder import encode_basestring_ascii
+
+from code_normal import Product, DigitalProduct, PhysicalProduct, Inventory, Order, Rule, INVENTORY
+
+CHUNK_SIZE = 64 * 1024
+
+COMPACT = (",", ":")
+
+CHUNK_SIZE_RULE = Rule(int, ValueError, "Chunk size must be a positive integer.", lambda size: size <= 0)
+SERIALIZED_PRODUCT = Rule(Product, TypeError, "Item to serialize must be an instance of Product.")
+SERIALIZED_ORDER = Rule(Order, TypeError, "Item to serialize must be an instance of Order.")
+
+
+def _string(value) -> str:
+    """Formats a string or None the way json.dumps does."""
+    if value is None:
+        return "null"
+    return encode_basestring_ascii(value)
+
+
+def _number(value) -> str:
+    """Formats a number the way json.dumps does."""
+    if value.__class__ is bool:
+        return "true" if value else "false"
+    if value.__class__ is float and not math.isfinite(value):
+        return json.dumps(value)
+    return repr(value)
+
+
+def product_json(product: Product) -> str:
+    """Returns get_details() of a product as compact JSON without building the details dict. Raises: TypeError."""
+    cls = type(product)
+    if cls is Product:
+        kind, extra = "GenericProduct", ""
+    elif cls is DigitalProduct:
+        kind = "DigitalProduct"
+        extra = f',"download_link":{_string(product.download_link)},"file_size_mb":{_number(product.file_size_mb)}'
+    elif cls is PhysicalProduct:
+        kind = "PhysicalProduct"
+        extra = (f',"weight_kg":{_number(product.weight_kg)},"shipping_dimensions_cm":'
+                 f'[{",".join(map(_number, product.shipping_dimensions))}]')
+    else:
+        SERIALIZED_PRODUCT.check(product)
+        return json.dumps(product.get_details(), separators=COMPACT)
+    return (f'{{"product_id":{_string(product.product_id)},"name":{_string(product.name)},'
+            f'"price":{_number(product.price)},"quantity":{_number(product.quantity)},"type":"{kind}"{extra}}}')
+
+
+def order_json(order: Order) -> str:
+    """Returns get_order_summary() of an order as compact JSON without building the summary dict. Raises: TypeError."""
+    SERIALIZED_ORDER.check(order)
+    items = ",".join(
+        f'{{"product_id":{_string(product_id)},"name":{_string(data["product_snapshot"]["name"])},'
+        f'"quantity":{_number(data["quantity"])},"unit_price":{_number(data["price_at_purchase"])},'
+        f'"subtotal":{_number(round(data["price_at_purchase"] * data["quantity"], 2))}}}'
+        for product_id, data in order.items.items()
+    )
+    return (f'{{"order_id":{_string(order.order_id)},"customer_id":{_string(order.customer_id)},'
+            f'"status":{_string(order.status)},"total_items":{_number(order.count_items())},'
+            f'"total_cost":{_number(order.calculate_total())},"items":[{items}]}}')
+
+
+def write_product(buffer: bytearray, product: Product) -> None:
+    """Appends a product as compact JSON to buffer. Raises: TypeError."""
+    buffer += product_json(product).encode("ascii")
+
+
+def write_order(buffer: bytearray, order: Order) -> None:
+    """Appends an order summary as compact JSON to buffer. Raises: TypeError."""
+    buffer += order_json(order).encode("ascii")
+
+
+def dump_inventory(inventory: Inventory, stream, chunk_size: int = CHUNK_SIZE) -> int:
+    """Writes every product as one JSON line to a binary stream, about chunk_size bytes per write. Returns the product count. Raises: TypeError, ValueError."""
+    INVENTORY.check(inventory)
+    CHUNK_SIZE_RULE.check(chunk_size)
+
+    buffer = bytearray()
+    count = 0
+    for product in inventory.products.values():
+        buffer += product_json(product).encode("ascii")
+        buffer += b"\n"
+        count += 1
+        if len(buffer) >= chunk_size:
+            stream.write(buffer)
+            buffer.clear()
+    if buffer:
+        stream.write(buffer)
+    return count
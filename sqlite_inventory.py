@@ -0,0 +1,462 @@
+import math
+import sqlite3
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from code_normal import (Product, DigitalProduct, PhysicalProduct, Inventory, _ReorderState, Rule, PRODUCT_ITEM,
+                         PRODUCT_ID, QUANTITY_CHANGE, POSITIVE_QUANTITY, INITIAL_STOCK, SEARCH_TERM, MIN_PRICE,
+                         MAX_PRICE, STOCK_THRESHOLD, TOP_K_COUNT)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL,
+    download_link TEXT,
+    file_size_mb REAL,
+    weight_kg REAL,
+    length REAL,
+    width REAL,
+    height REAL
+);
+CREATE INDEX IF NOT EXISTS products_name ON products (name_lower);
+CREATE INDEX IF NOT EXISTS products_price ON products (price, position);
+CREATE INDEX IF NOT EXISTS products_type ON products (type);
+CREATE INDEX IF NOT EXISTS products_quantity ON products (quantity, position);
+CREATE TABLE IF NOT EXISTS reorder_thresholds (
+    product_id TEXT PRIMARY KEY,
+    threshold INTEGER NOT NULL
+);
+"""
+
+NAME_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS products_name_search
+    USING fts5(name_lower, content='products', content_rowid='position', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS products_name_search_insert AFTER INSERT ON products BEGIN
+    INSERT INTO products_name_search (rowid, name_lower) VALUES (new.position, new.name_lower);
+END;
+CREATE TRIGGER IF NOT EXISTS products_name_search_delete AFTER DELETE ON products BEGIN
+    INSERT INTO products_name_search (products_name_search, rowid, name_lower)
+        VALUES ('delete', old.position, old.name_lower);
+END;
+CREATE TRIGGER IF NOT EXISTS products_name_search_update AFTER UPDATE OF name_lower ON products BEGIN
+    INSERT INTO products_name_search (products_name_search, rowid, name_lower)
+        VALUES ('delete', old.position, old.name_lower);
+    INSERT INTO products_name_search (rowid, name_lower) VALUES (new.position, new.name_lower);
+END;
+"""
+
+COLUMNS = ("product_id, type, name, price, quantity, download_link, file_size_mb, "
+           "weight_kg, length, width, height")
+
+CACHE_SIZE = Rule(int, ValueError, "Cache size must be a positive integer.", lambda size: size <= 0)
+WRITE_BATCH = Rule(int, ValueError, "Write batch size must be a positive integer.", lambda size: size <= 0)
+
+
+
+class _StoredProducts(Mapping):
+    """
+    Read-only mapping of product ID to product over the rows of an SQLiteInventory, in the order
+    the products were added, standing in for Inventory.products.
+    """
+    def __init__(self, inventory: "SQLiteInventory"):
+        self._inventory = inventory
+
+    def __getitem__(self, product_id: str) -> Product:
+        if PRODUCT_ID.violation(product_id) is not None:
+            raise KeyError(product_id)
+        return self._inventory.get_product(product_id)
+
+    def __iter__(self):
+        for (product_id,) in self._inventory._db.execute("SELECT product_id FROM products ORDER BY position"):
+            yield product_id
+
+    def __len__(self) -> int:
+        return self._inventory._db.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+
+class SQLiteInventory:
+    """
+    Inventory stored in a SQLite database. It has every public method of Inventory, with the
+    same signatures and exceptions, a change_feed attribute, and is registered as an Inventory;
+    products is a read-only mapping over the rows. Name, price, low-stock and top-k queries
+    run in SQL, reorder thresholds are stored in the database, stock updates are grouped into
+    transactions that commit every write_batch writes, and recently used products are kept
+    in an LRU cache.
+    A row has at most one live Product object: one that is still referenced after leaving
+    the cache is handed out again, so changes made through it keep being written back.
+    """
+    def __init__(self, path: str = ":memory:", cache_size: int = 1024, write_batch: int = 256):
+        """Opens or creates the database at path. Raises: ValueError."""
+        self.cache_size = CACHE_SIZE.check(cache_size)
+        self.write_batch = WRITE_BATCH.check(write_batch)
+        self._cache = OrderedDict()
+        self._live = weakref.WeakValueDictionary()
+        self.products = _StoredProducts(self)
+        self._uncommitted = 0
+        self._reorder_listeners = []
+        self._reorder_state = _ReorderState()
+        self.change_feed = None
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCHEMA)
+        try:
+            self._db.executescript(NAME_SEARCH_SCHEMA)
+            self._name_search = True
+        except sqlite3.OperationalError:
+            self._name_search = False
+        self._total_value = self._db.execute("SELECT COALESCE(SUM(price * quantity), 0.0) FROM products").fetchone()[0]
+
+    def add_product(self, product: Product, initial_stock: int = None) -> None:
+        """Adds a product to the inventory. Raises: TypeError, ValueError."""
+        PRODUCT_ITEM.check(product)
+        if self._row(product.product_id) is not None:
+            raise ValueError(f"Product with ID {product.product_id} already exists in inventory.")
+        if initial_stock is not None:
+            product.quantity = INITIAL_STOCK.check(initial_stock)
+
+        self._insert(product)
+        self._cache_product(product)
+        self._wrote()
+        if self.change_feed is not None:
+            self.change_feed._emit("add", product.product_id, product.get_details())
+
+    def add_products(self, records) -> dict:
+        """Bulk-loads products from a dict of columns or an iterable of row dicts in one transaction. Raises: TypeError, ValueError."""
+        invalid, products = Inventory._products_from_records(records)
+        report = {"added": [], "duplicates": [], "invalid": invalid}
+        added = []
+        self._commit_pending()
+        with self._db:
+            for row, product in products:
+                if self._row(product.product_id) is not None:
+                    report["duplicates"].append({"row": row, "product_id": product.product_id})
+                    continue
+                self._insert(product)
+                added.append(product)
+        report["added"] = [product.product_id for product in added]
+        if self.change_feed is not None:
+            for product in added:
+                self.change_feed._emit("add", product.product_id, product.get_details())
+        return report
+
+    def remove_product(self, product_id: str) -> Product:
+        """Removes a product from inventory by ID. Raises: TypeError, KeyError."""
+        product = self.get_product(product_id)
+        self._db.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
+        self._total_value -= product.price * product.quantity
+        self._db.execute("DELETE FROM reorder_thresholds WHERE product_id = ?", (product_id,))
+        del self._cache[product_id]
+        del self._live[product_id]
+        product._inventories = tuple(inventory for inventory in product._inventories if inventory is not self)
+        self._wrote()
+        if self.change_feed is not None:
+            self.change_feed._emit("remove", product_id, None)
+        return product
+
+    def get_product(self, product_id: str) -> Product:
+        """Retrieves a product from inventory by ID. Raises: TypeError, KeyError."""
+        PRODUCT_ID.check(product_id)
+        product = self._cache.get(product_id)
+        if product is not None:
+            self._cache.move_to_end(product_id)
+            return product
+        product = self._live.get(product_id)
+        if product is not None:
+            return self._cache_product(product)
+        row = self._row(product_id)
+        if row is None:
+            raise KeyError(f"Product with ID {product_id} not found in inventory.")
+        return self._cache_product(self._build(row))
+
+    def update_stock(self, product_id: str, quantity_change: int) -> None:
+        """Updates stock quantity of a product. Raises: TypeError, KeyError, ValueError."""
+        product = self.get_product(product_id)
+        try:
+            product.update_quantity(quantity_change)
+        except ValueError as e:
+            raise ValueError(f"Stock update for {product_id} failed: {e}")
+
+    def reserve(self, product_id: str, quantity: int) -> None:
+        """Takes quantity units of a product out of stock. Raises: TypeError, KeyError, ValueError."""
+        POSITIVE_QUANTITY.check(quantity)
+        self._reserve(PRODUCT_ID.check(product_id), quantity)
+
+    def release(self, product_id: str, quantity: int) -> None:
+        """Returns quantity reserved units of a product to stock. Raises: TypeError, KeyError, ValueError."""
+        POSITIVE_QUANTITY.check(quantity)
+        self._release(PRODUCT_ID.check(product_id), quantity)
+
+    def _reserve(self, product_id: str, quantity: int) -> None:
+        """Reserves stock for an already validated product ID and positive quantity. Raises: KeyError, ValueError."""
+        product = self.get_product(product_id)
+        if product.quantity < quantity:
+            raise ValueError(f"Not enough stock for {product.name} (ID: {product_id}). Requested: {quantity}, Available: {product.quantity}")
+        product.quantity -= quantity
+
+    def _release(self, product_id: str, quantity: int) -> None:
+        """Releases stock for an already validated product ID and positive quantity. Raises: KeyError."""
+        self.get_product(product_id).quantity += quantity
+
+    def update_stock_many(self, changes) -> list:
+        """Applies (product_id, quantity_change) pairs all-or-nothing in one transaction, then tells the other inventories holding a changed product. Returns the rejected rows."""
+        pending = {}
+        rejected = []
+        for row, change in enumerate(changes):
+            try:
+                product_id, quantity_change = change
+            except (TypeError, ValueError):
+                product_id = quantity_change = None
+                error = "Stock change must be a (product_id, quantity_change) pair."
+            else:
+                error = PRODUCT_ID.violation(product_id) or QUANTITY_CHANGE.violation(quantity_change)
+                if error is None:
+                    if product_id not in pending:
+                        stored = self._db.execute("SELECT price, quantity FROM products WHERE product_id = ?",
+                                                  (product_id,)).fetchone()
+                        pending[product_id] = [stored[0], stored[1], stored[1]] if stored else None
+                    if pending[product_id] is None:
+                        error = f"Product with ID {product_id} not found in inventory."
+                    elif pending[product_id][2] + quantity_change >= 0:
+                        pending[product_id][2] += quantity_change
+                        continue
+                    else:
+                        error = f"Stock update for {product_id} failed: Quantity cannot be reduced below zero."
+            rejected.append({
+                "row": row,
+                "product_id": product_id,
+                "quantity_change": quantity_change,
+                "error": error
+            })
+
+        if not rejected:
+            self._commit_pending()
+            with self._db:
+                for product_id, (price, old_quantity, quantity) in pending.items():
+                    self._db.execute("UPDATE products SET quantity = ? WHERE product_id = ?", (quantity, product_id))
+                    self._total_value += price * (quantity - old_quantity)
+            with self._deferred_reorders():
+                for product_id, (price, old_quantity, quantity) in pending.items():
+                    product = self._live.get(product_id)
+                    if product is not None:
+                        product._quantity = quantity
+                        product._details = None
+                        for inventory in product._inventories:
+                            if inventory is not self:
+                                inventory._on_product_changed(product, "quantity", old_quantity)
+                    if self.change_feed is not None:
+                        self.change_feed._emit("quantity", product_id, quantity)
+                    self._check_reorder(product_id, old_quantity, quantity)
+        return rejected
+
+    def get_total_inventory_value(self) -> float:
+        """Returns the total value of all products in stock."""
+        return round(self._total_value, 2)
+
+    def verify(self) -> bool:
+        """Checks the running inventory value against a full recomputation, resyncing it on mismatch."""
+        recomputed = self._db.execute("SELECT COALESCE(SUM(price * quantity), 0.0) FROM products").fetchone()[0]
+        consistent = math.isclose(recomputed, self._total_value, rel_tol=1e-9, abs_tol=1e-6)
+        if not consistent:
+            self._total_value = recomputed
+        return consistent
+
+    def find_products_by_name(self, search_term: str, case_sensitive: bool = False) -> list:
+        """Finds products by partial name match. Raises: TypeError."""
+        SEARCH_TERM.check(search_term)
+        key = search_term.lower()
+        column, term = ("name", search_term) if case_sensitive else ("name_lower", key)
+        if self._name_search and len(key) >= 3 and key.isascii():
+            rows = self._db.execute(
+                f"SELECT {COLUMNS} FROM products WHERE position IN "
+                "(SELECT rowid FROM products_name_search WHERE products_name_search MATCH ?) "
+                f"AND instr({column}, ?) > 0 ORDER BY position",
+                ('"' + key.replace('"', '""') + '"', term)
+            )
+        else:
+            rows = self._db.execute(f"SELECT {COLUMNS} FROM products WHERE instr({column}, ?) > 0 ORDER BY position",
+                                    (term,))
+        return [self._product_for_row(row) for row in rows]
+
+    def get_products_in_price_range(self, min_price: float = 0, max_price: float = float('inf')) -> list:
+        """Returns products in price range. Raises: ValueError."""
+        MIN_PRICE.check(min_price)
+        MAX_PRICE.check(max_price, min_price)
+
+        rows = self._db.execute(f"SELECT {COLUMNS} FROM products WHERE price BETWEEN ? AND ? ORDER BY position",
+                                (min_price, max_price))
+        return [self._product_for_row(row) for row in rows]
+
+    def get_stock_level(self, product_id: str) -> int:
+        """Gets stock level for a product. Raises: TypeError, KeyError."""
+        product = self.get_product(product_id)
+        return product.quantity
+
+    def set_reorder_threshold(self, product_id: str, threshold: int = None) -> None:
+        """Sets the stock level below which a product needs reordering; None clears it. Raises: TypeError, KeyError, ValueError."""
+        product = self.get_product(product_id)
+        old_threshold = self._reorder_threshold(product_id)
+        if threshold is None:
+            self._db.execute("DELETE FROM reorder_thresholds WHERE product_id = ?", (product_id,))
+        else:
+            STOCK_THRESHOLD.check(threshold)
+            self._db.execute("INSERT OR REPLACE INTO reorder_thresholds (product_id, threshold) VALUES (?, ?)",
+                             (product_id, threshold))
+        self._wrote()
+        was_below = old_threshold is not None and product.quantity < old_threshold
+        if threshold is not None and product.quantity < threshold and not was_below:
+            self._queue_reorder(product, threshold)
+
+    def get_reorder_threshold(self, product_id: str) -> int:
+        """Returns a product's reorder threshold, or None if it has none. Raises: TypeError, KeyError."""
+        self.get_product(product_id)
+        return self._reorder_threshold(product_id)
+
+    def get_low_stock_products(self, threshold: int = None) -> list:
+        """Returns products whose quantity is below threshold, or below their own reorder threshold when none is given. Raises: ValueError."""
+        if threshold is None:
+            rows = self._db.execute(f"SELECT {COLUMNS} FROM products JOIN reorder_thresholds USING (product_id) "
+                                    "WHERE quantity < threshold ORDER BY position")
+        else:
+            STOCK_THRESHOLD.check(threshold)
+            rows = self._db.execute(f"SELECT {COLUMNS} FROM products WHERE quantity < ? ORDER BY position",
+                                    (threshold,))
+        return [self._product_for_row(row) for row in rows]
+
+    def top_k(self, key: str, k: int, largest: bool = True) -> list:
+        """Returns the k products with the largest (or smallest) price, quantity or value, ties in the order they were added. Raises: ValueError."""
+        if key not in Inventory.TOP_K_KEYS:
+            raise ValueError(f"Invalid top-k key '{key}'. Allowed keys are: {', '.join(Inventory.TOP_K_KEYS)}")
+        TOP_K_COUNT.check(k)
+        rank = "price * quantity" if key == "value" else key
+        rows = self._db.execute(f"SELECT {COLUMNS} FROM products ORDER BY {rank} {'DESC' if largest else 'ASC'}, "
+                                "position LIMIT ?", (k,))
+        return [self._product_for_row(row) for row in rows]
+
+    add_reorder_listener = Inventory.add_reorder_listener
+    remove_reorder_listener = Inventory.remove_reorder_listener
+    _deferred_reorders = Inventory._deferred_reorders
+    _notify_reorder = Inventory._notify_reorder
+
+    def commit(self) -> None:
+        """Commits every pending write."""
+        self._commit_pending()
+
+    def close(self) -> None:
+        """Commits pending writes and closes the database."""
+        self._commit_pending()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _row(self, product_id: str):
+        """Returns the stored columns of a product, or None if there is no such product."""
+        return self._db.execute(f"SELECT {COLUMNS} FROM products WHERE product_id = ?", (product_id,)).fetchone()
+
+    def _insert(self, product: Product) -> None:
+        """Inserts a validated product's row and adds its stock to the running value."""
+        type_name = Inventory._type_name(product)
+        digital = type_name == "DigitalProduct"
+        physical = type_name == "PhysicalProduct"
+        self._db.execute(
+            f"INSERT INTO products ({COLUMNS}, name_lower) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (product.product_id, type_name, product.name, product.price, product.quantity,
+             product.download_link if digital else None, product.file_size_mb if digital else None,
+             product.weight_kg if physical else None,
+             *(product.shipping_dimensions if physical else (None, None, None)), product.name.lower())
+        )
+        self._total_value += product.price * product.quantity
+
+    def _build(self, row: tuple) -> Product:
+        """Builds a product from a database row and registers it for write-back."""
+        (product_id, type_name, name, price, quantity, download_link, file_size_mb,
+         weight_kg, length, width, height) = row
+        cls = Inventory.PRODUCT_TYPES[type_name]
+        fields = {}
+        if cls is DigitalProduct:
+            fields = {"download_link": download_link, "file_size_mb": file_size_mb}
+        elif cls is PhysicalProduct:
+            fields = {"weight_kg": weight_kg, "shipping_dimensions": (length, width, height)}
+        return cls._from_trusted(name, price, product_id, quantity, **fields)
+
+    def _product_for_row(self, row: tuple) -> Product:
+        """Returns the live product for a row, building it when there is none."""
+        product = self._cache.get(row[0])
+        if product is not None:
+            self._cache.move_to_end(row[0])
+            return product
+        product = self._live.get(row[0])
+        return self._cache_product(product if product is not None else self._build(row))
+
+    def _cache_product(self, product: Product) -> Product:
+        """Puts a product at the hot end of the LRU cache, evicting the coldest one when full."""
+        if self not in product._inventories:
+            product._inventories += (self,)
+        self._live[product.product_id] = product
+        self._cache[product.product_id] = product
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return product
+
+    def _wrote(self) -> None:
+        """Counts a write in the open transaction, committing when the write batch is full."""
+        self._uncommitted += 1
+        if self._uncommitted >= self.write_batch:
+            self._commit_pending()
+
+    def _commit_pending(self) -> None:
+        """Commits the open transaction if it has any writes."""
+        if self._uncommitted:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def _reorder_threshold(self, product_id: str) -> int:
+        """Returns the stored reorder threshold of a product, or None."""
+        row = self._db.execute("SELECT threshold FROM reorder_thresholds WHERE product_id = ?",
+                               (product_id,)).fetchone()
+        return row[0] if row else None
+
+    def _check_reorder(self, product_id: str, old_quantity: int, quantity: int) -> None:
+        """Queues a reorder notification when a quantity change took a product below its threshold."""
+        if not self._reorder_listeners or quantity >= old_quantity:
+            return
+        threshold = self._reorder_threshold(product_id)
+        if threshold is not None and quantity < threshold <= old_quantity:
+            self._queue_reorder(self.get_product(product_id), threshold)
+
+    def _queue_reorder(self, product: Product, threshold: int) -> None:
+        """Queues a reorder notification, delivering it at once unless notifications are deferred."""
+        if self._reorder_listeners:
+            state = self._reorder_state
+            state.pending.append((product, threshold))
+            if not state.holds:
+                self._notify_reorder()
+
+    def _on_product_changed(self, product: Product, field: str, old_value) -> None:
+        """Writes a change made through a product object back to the database."""
+        if field == "quantity":
+            self._db.execute("UPDATE products SET quantity = ? WHERE product_id = ?",
+                             (product.quantity, product.product_id))
+            self._total_value += product.price * (product.quantity - old_value)
+        elif field == "price":
+            self._db.execute("UPDATE products SET price = ? WHERE product_id = ?", (product.price, product.product_id))
+            self._total_value += (product.price - old_value) * product.quantity
+        elif field == "name":
+            self._db.execute("UPDATE products SET name = ?, name_lower = ? WHERE product_id = ?",
+                             (product.name, product.name.lower(), product.product_id))
+        self._wrote()
+        if self.change_feed is not None:
+            self.change_feed._emit(field, product.product_id, getattr(product, field))
+        if field == "quantity":
+            self._check_reorder(product.product_id, old_value, product.quantity)
+
+
+Inventory.register(SQLiteInventory)